@@ -0,0 +1,116 @@
+"""Vectorized evaluation of many 3x3 boards at once with NumPy.
+
+Boards are ``(N, 9)`` int8 arrays in row-major cell order, holding EMPTY, X or O.
+Results follow Grid.check_win, Grid.check_tie and Grid.get_winning_cells.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+import bitboard
+import tablebase
+from main import MARKER
+
+EMPTY = 0
+X = 1
+O = 2
+MARKERS = {MARKER.X: X, MARKER.O: O}
+
+# Cell indices of every win line, in Grid.check_win order
+LINE_CELLS = np.array(
+    [[row * bitboard.SIZE + col for row, col in line] for line in bitboard.get_geometry().line_cells],
+    dtype=np.intp
+)
+POWERS = 3 ** np.arange(bitboard.SIZE * bitboard.SIZE, dtype=np.int32)
+
+Evaluation = namedtuple("Evaluation", ["winners", "ties", "x_threats", "o_threats", "best_moves"])
+
+_table = None
+
+
+def from_grids(grids):
+    boards = np.zeros((len(grids), bitboard.SIZE * bitboard.SIZE), dtype=np.int8)
+    for i, grid in enumerate(grids):
+        for j, cell in enumerate(grid.all_cells()):
+            boards[i, j] = MARKERS.get(cell.marker, EMPTY)
+    return boards
+
+
+def get_line_counts(boards, marker):
+    """Returns an ``(N, lines)`` array of how many of the marker's cells each line holds"""
+    return (boards[:, LINE_CELLS] == marker).sum(axis=2)
+
+
+def check_win(boards, marker):
+    return (get_line_counts(boards, marker) == bitboard.SIZE).any(axis=1)
+
+
+def check_tie(boards):
+    return (boards != EMPTY).all(axis=1)
+
+
+def get_winners(boards):
+    """Returns X or O for boards with a completed line, checking X first, and EMPTY otherwise"""
+    return np.where(check_win(boards, X), X, np.where(check_win(boards, O), O, EMPTY)).astype(np.int8)
+
+
+def get_threat_lines(boards, marker):
+    """Returns an ``(N, lines)`` mask of lines one marker short of a win with the remaining cell empty"""
+    empty = get_line_counts(boards, EMPTY)
+    return (get_line_counts(boards, marker) == bitboard.SIZE - 1) & (empty == 1)
+
+
+def count_threats(boards, marker):
+    """Returns ``len(grid.get_winning_cells(marker))`` for every board"""
+    return get_threat_lines(boards, marker).sum(axis=1)
+
+
+def get_winning_cells(boards, marker):
+    """Returns an ``(N, 9)`` array of how many times each cell appears in ``grid.get_winning_cells(marker)``"""
+    threat_lines = get_threat_lines(boards, marker)
+    counts = np.zeros(boards.shape, dtype=np.int8)
+    rows = np.arange(len(boards))[:, None]
+    for line, cells in enumerate(LINE_CELLS):
+        empty_cells = (boards[:, cells] == EMPTY) & threat_lines[:, line:line + 1]
+        np.add.at(counts, (rows, cells[None, :]), empty_cells)
+    return counts
+
+
+def get_table():
+    global _table
+    if _table is None:
+        default = tablebase.get_default()
+        if default is not None:
+            _table = np.frombuffer(default.data, dtype=np.uint8, offset=len(tablebase.MAGIC))
+        else:
+            _table = np.frombuffer(bytes(tablebase.get_table()), dtype=np.uint8)
+    return _table
+
+
+def get_to_move(boards, first=X):
+    """Returns the marker to move on every board, given which marker moved first"""
+    second = O if first == X else X
+    first_count = (boards == first).sum(axis=1)
+    second_count = (boards == second).sum(axis=1)
+    return np.where(first_count == second_count, first, second).astype(np.int8)
+
+
+def get_best_moves(boards, to_move=None):
+    """Returns the tablebase move for the marker to move on every board, or -1 when there is none"""
+    to_move = get_to_move(boards) if to_move is None else np.broadcast_to(to_move, len(boards))
+    # Ranks count the player to move as 1 and the opponent as 2
+    relative = np.where(boards == EMPTY, 0, np.where(boards == to_move[:, None], 1, 2))
+    entries = get_table()[relative @ POWERS]
+    moves = (entries & 0xF).astype(np.int8)
+    return np.where((moves == tablebase.NO_MOVE) | (entries >> 4 == tablebase.VALUE.ILLEGAL), -1, moves)
+
+
+def evaluate(boards, to_move=None):
+    boards = np.asarray(boards, dtype=np.int8)
+    return Evaluation(
+        winners=get_winners(boards),
+        ties=check_tie(boards),
+        x_threats=count_threats(boards, X),
+        o_threats=count_threats(boards, O),
+        best_moves=get_best_moves(boards, to_move),
+    )
@@ -0,0 +1,207 @@
+"""Benchmarks for the computer's move time and the board checks, without a display.
+
+``python benchmark.py --save baseline.json`` records a baseline, and
+``python benchmark.py --compare baseline.json`` flags any benchmark that got
+slower than the baseline by more than the threshold.
+"""
+import argparse
+import io
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from instrument import Instrumentation
+from main import MARKER, Computer, Grid, RandomPlayer
+from simulate import play_game
+
+# Boards in row-major order, with the player to move worked out from the marker counts (x first)
+TRAP_POSITIONS = [
+    "x...o...x",
+    "o...x...x",
+    ".x.xo....",
+    "x....x.o.",
+    "..x.o.x..",
+]
+
+
+def get_corpus():
+    """Returns the boards the move time is measured on"""
+    corpus = ["........."]
+    corpus += ["." * i + "x" + "." * (8 - i) for i in range(9)]
+    corpus += TRAP_POSITIONS
+    corpus += get_near_terminal_positions(10)
+    return corpus
+
+
+def get_near_terminal_positions(count, markers=6, seed=0):
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        grid = Grid()
+        cells = grid.all_cells()
+        rng.shuffle(cells)
+        for i, cell in enumerate(cells[:markers]):
+            cell.marker = MARKER.X if i % 2 == 0 else MARKER.O
+        if not grid.check_win(MARKER.X)[0] and not grid.check_win(MARKER.O)[0]:
+            positions.append(grid.to_string())
+    return positions
+
+
+def from_string(board):
+    grid = Grid()
+    for cell, marker in zip(grid.all_cells(), board):
+        cell.marker = None if marker == "." else marker
+    return grid
+
+
+def get_marker_to_move(board):
+    return MARKER.X if board.count(MARKER.X) == board.count(MARKER.O) else MARKER.O
+
+
+def time_calls(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return time.perf_counter() - start
+
+
+def get_percentile(samples, percent):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def get_latencies(samples):
+    return {
+        "p50": get_percentile(samples, 50),
+        "p95": get_percentile(samples, 95),
+        "p99": get_percentile(samples, 99),
+    }
+
+
+def get_peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_choose_cell(repeat, use_tablebase):
+    corpus = get_corpus()
+
+    def choose_all(instrumentation=None):
+        samples = []
+        for board in corpus:
+            grid = from_string(board)
+            # A new computer every time so the transposition table starts empty
+            computer = Computer(get_marker_to_move(board), use_tablebase=use_tablebase,
+                                instrumentation=instrumentation)
+            start = time.perf_counter()
+            computer.choose_cell(grid)
+            samples.append(time.perf_counter() - start)
+        return samples
+
+    samples = [sample for _ in range(repeat) for sample in choose_all()]
+    sink = io.StringIO()
+    choose_all(Instrumentation(sink))
+    nodes = sum(json.loads(line)["nodes"] for line in sink.getvalue().splitlines())
+    result = get_latencies(samples)
+    if nodes:
+        result["nodes_per_second"] = nodes * repeat / sum(samples)
+    result["peak_memory"] = get_peak_memory(choose_all)
+    return result
+
+
+def query_grids(grids, method):
+    """Calls ``method`` on every pair of grid and marker"""
+    for grid, marker in grids:
+        # Forget the memoized threats, so every call runs the query instead of a cache lookup
+        grid.winning_cells.clear()
+        getattr(grid, method)(marker)
+
+
+def bench_grid(method, repeat):
+    grids = [(from_string(board), get_marker_to_move(board)) for board in get_corpus()]
+
+    def call_all():
+        query_grids(grids, method)
+
+    calls = 1000 * repeat
+    elapsed = time_calls(call_all, calls)
+    return {"calls_per_second": calls * len(grids) / elapsed, "peak_memory": get_peak_memory(call_all)}
+
+
+def bench_games(repeat):
+    games = 200 * repeat
+    computer = Computer(MARKER.X)
+    opponent = RandomPlayer(MARKER.O, MARKER.BLUE, "second", seed=0)
+
+    def play():
+        play_game(computer, opponent)
+
+    elapsed = time_calls(play, games)
+    return {"games_per_second": games / elapsed, "peak_memory": get_peak_memory(play)}
+
+
+def run(repeat):
+    results = {
+        "choose_cell_search": bench_choose_cell(repeat, use_tablebase=False),
+        "check_win": bench_grid("check_win", repeat),
+        "get_winning_cells": bench_grid("get_winning_cells", repeat),
+        "full_game": bench_games(repeat),
+    }
+    if Computer().tablebase is not None:
+        results["choose_cell_tablebase"] = bench_choose_cell(repeat, use_tablebase=True)
+    return results
+
+
+def is_better_higher(metric):
+    return metric.endswith("per_second") or metric == "relative_speed"
+
+
+def compare(results, baseline, threshold):
+    """Returns a line for every metric that is worse than the baseline by more than ``threshold``"""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            if not old:
+                continue
+            change = value / old - 1
+            if is_better_higher(metric):
+                change = -change
+            if change > threshold:
+                regressions.append(f"{name}.{metric}: {old:.4g} -> {value:.4g} ({change:+.0%} worse)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="times to run each benchmark")
+    parser.add_argument("--save", metavar="FILE", help="write the results to FILE as the new baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare the results with the baseline in FILE")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, as a fraction")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    for name, metrics in results.items():
+        print(name)
+        for metric, value in metrics.items():
+            print(f"  {metric:<20} {value:.4g}")
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
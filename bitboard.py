@@ -0,0 +1,168 @@
+"""Bitboard representation of the board used by the AI search.
+
+Each player's markers are stored as an integer where bit ``row * columns + col``
+is set if that cell is marked. The module level tables cover the classic 3x3
+board; Geometry describes boards of any size and win length.
+"""
+from functools import lru_cache
+
+SIZE = 3
+FULL = (1 << SIZE * SIZE) - 1
+
+
+def cell_bit(row, col):
+    return 1 << (row * SIZE + col)
+
+
+def cell_index(bit):
+    return bit.bit_length() - 1
+
+
+def iterate_bits(bits):
+    while bits:
+        bit = bits & -bits
+        yield bit
+        bits ^= bit
+
+
+class Geometry:
+    """Win lines of a board with the given number of rows and columns and line length needed to win"""
+    NEIGHBOURHOOD = 2
+
+    def __init__(self, rows, columns, win_length):
+        self.rows = rows
+        self.columns = columns
+        self.win_length = win_length
+        self.size = rows * columns
+        self.full = (1 << self.size) - 1
+        # Same order as Grid.check_win: rows, columns, ascending diagonals, descending diagonals
+        self.line_cells = []
+        self.line_names = []
+        self.add_lines("row", rows, columns - win_length + 1, lambda row, col, i: (row, col + i))
+        self.add_lines("column", rows - win_length + 1, columns, lambda row, col, i: (row + i, col))
+        self.add_lines("ascending diagonal", rows - win_length + 1, columns - win_length + 1,
+                       lambda row, col, i: (row + i, col + win_length - 1 - i))
+        self.add_lines("descending diagonal", rows - win_length + 1, columns - win_length + 1,
+                       lambda row, col, i: (row + i, col + i))
+        self.line_indices = tuple(tuple(row * columns + col for row, col in cells) for cells in self.line_cells)
+        self.lines = tuple(self.get_mask(cells) for cells in self.line_cells)
+        self.cell_line_indices = tuple(
+            tuple(line for line, mask in enumerate(self.lines) if mask >> index & 1)
+            for index in range(self.size)
+        )
+        self.cell_lines = tuple(
+            tuple(self.lines[line] for line in lines)
+            for lines in self.cell_line_indices
+        )
+        self.neighbours = tuple(self.get_neighbours(index) for index in range(self.size))
+
+    def add_lines(self, name, rows, columns, get_cell):
+        for row in range(max(rows, 0)):
+            for col in range(max(columns, 0)):
+                self.line_cells.append(tuple(get_cell(row, col, i) for i in range(self.win_length)))
+                self.line_names.append(name)
+
+    def get_bit(self, row, col):
+        return 1 << (row * self.columns + col)
+
+    def get_mask(self, cells):
+        mask = 0
+        for row, col in cells:
+            mask |= self.get_bit(row, col)
+        return mask
+
+    def get_neighbours(self, index):
+        row, col = divmod(index, self.columns)
+        distance = Geometry.NEIGHBOURHOOD
+        return self.get_mask(
+            (r, c)
+            for r in range(max(row - distance, 0), min(row + distance + 1, self.rows))
+            for c in range(max(col - distance, 0), min(col + distance + 1, self.columns))
+        )
+
+    def has_line(self, bits, last):
+        """Checks the lines through the cell ``last`` for a completed line"""
+        for mask in self.cell_lines[cell_index(last)]:
+            if bits & mask == mask:
+                return True
+        return False
+
+
+@lru_cache(maxsize=None)
+def get_geometry(rows=SIZE, columns=SIZE, win_length=SIZE):
+    return Geometry(rows, columns, win_length)
+
+
+WIN_LINES = get_geometry().lines
+
+# Unmarked cells of every possible free mask, as single bits in row-major order
+UNMARKED = tuple(
+    tuple(1 << i for i in range(SIZE * SIZE) if free >> i & 1)
+    for free in range(FULL + 1)
+)
+
+# Whether each possible set of markers contains a complete line
+WON = tuple(
+    any(bits & mask == mask for mask in WIN_LINES)
+    for bits in range(FULL + 1)
+)
+
+
+def _transform_table(transform):
+    images = [cell_bit(*transform(*divmod(index, SIZE))) for index in range(SIZE * SIZE)]
+    table = [0]
+    # Every set of markers is a smaller set plus its highest marker
+    for bits in range(1, FULL + 1):
+        table.append(table[bits & ~(1 << bits.bit_length() - 1)] | images[bits.bit_length() - 1])
+    return tuple(table)
+
+
+# The 8 rotations and reflections of the board, as lookup tables over every set of markers
+SYMMETRIES = tuple(_transform_table(transform) for transform in [
+    lambda row, col: (row, col),
+    lambda row, col: (col, SIZE - 1 - row),
+    lambda row, col: (SIZE - 1 - row, SIZE - 1 - col),
+    lambda row, col: (SIZE - 1 - col, row),
+    lambda row, col: (row, SIZE - 1 - col),
+    lambda row, col: (SIZE - 1 - row, col),
+    lambda row, col: (col, row),
+    lambda row, col: (SIZE - 1 - col, SIZE - 1 - row),
+])
+
+_winning_cells = {}
+
+
+def is_full(own, opp):
+    return own | opp == FULL
+
+
+def has_won(bits):
+    return WON[bits]
+
+
+def get_unmarked_cells(own, opp):
+    return UNMARKED[FULL ^ (own | opp)]
+
+
+def get_winning_cells(own, opp):
+    """Bitboard equivalent of Grid.get_winning_cells.
+
+    Returns the empty cell of every line holding two of ``own`` markers and no
+    ``opp`` marker, in line order. A cell completing two lines appears twice.
+    """
+    key = own << 9 | opp
+    cells = _winning_cells.get(key)
+    if cells is None:
+        cells = []
+        for mask in WIN_LINES:
+            if not opp & mask:
+                missing = mask ^ (own & mask)
+                if missing and not missing & (missing - 1):
+                    cells.append(missing)
+        cells = _winning_cells[key] = tuple(cells)
+    return cells
+
+
+def canonical(own, opp):
+    """Returns the smallest ``own << 9 | opp`` hash over all symmetries of the board"""
+    return min(table[own] << 9 | table[opp] for table in SYMMETRIES)
@@ -0,0 +1,492 @@
+"""Turtle front end of the game. ``python main.py`` opens it."""
+import argparse
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from turtle import Turtle, TurtleScreen, Screen
+
+from main import MARKER, Cell, Computer, GameOver, Grid, Menu, MonteCarloPlayer, Player, Rect, TextBox, TranspositionTable
+
+
+def wrap(method):
+    """Calls a decorator that is defined as a static method"""
+    def caller(func_to_be_wrapped):
+        decorator_raw = method.__func__
+        return decorator_raw(func_to_be_wrapped)  # returns wrapper defined in the decorator
+    return caller
+
+
+class GameScreen(TurtleScreen):
+    def __new__(cls, *args, **kwargs):
+        instance = Screen()
+        instance.setup(300, 300)
+        instance.__class__ = cls
+        return instance
+
+    def __init__(self, onclick):
+        super().__init__(self.getcanvas())
+        self.onclick(onclick)
+        self.enable_clicks = True
+        try:
+            with open(".replit"):
+                self.getcanvas().winfo_toplevel().attributes('-fullscreen', True)
+        except FileNotFoundError:
+            self.screensize(250, 250)
+
+
+class GamePen(Turtle):
+    DEFAULT_SPEED = 6
+    DEFAULT_SIZE = 3
+    CIRCLE_POINTS = 24
+
+    def __init__(self, animate=True):
+        super().__init__()
+        self.shape("circle")
+        self.speed(GamePen.DEFAULT_SPEED)
+        self.pensize(GamePen.DEFAULT_SIZE)
+        self.hideturtle()
+        self.animate = animate
+        self.queue = []
+        self.writers = {}
+        self.getscreen().delay(20 if animate else 0)
+
+    @staticmethod
+    def queued(func):
+        """Animates the drawing, or saves it for the next flush when animation is off"""
+        def wrapper(self: Turtle, *args, **kwargs):
+            if self.animate:
+                self.showturtle()
+                func(self, *args, **kwargs)
+                self.hideturtle()
+            else:
+                self.queue.append((func, args, kwargs))
+        return wrapper
+
+    @staticmethod
+    def draw_instantly(func):
+        def wrapper(self: Turtle, *args, **kwargs):
+            self.getscreen().tracer(0)
+            func(self, *args, **kwargs)
+            self.getscreen().tracer(1)
+        return wrapper
+
+    @wrap(draw_instantly)
+    def flush(self):
+        """Draws everything queued since the last flush in a single frame"""
+        for func, args, kwargs in self.queue:
+            func(self, *args, **kwargs)
+        self.queue.clear()
+
+    def clear_all(self):
+        self.clear()
+        for writer in self.writers.values():
+            writer.clear()
+
+    def write_text(self, text: str, x, y, font_size):
+        self.up()
+        self.goto(x, y - font_size * 0.75)
+        self.write(text, align="center", font=('Arial', font_size, 'normal'))
+
+    def draw_line(self, start_x, start_y, end_x, end_y):
+        self.penup()
+        self.goto(start_x, start_y)
+        self.pendown()
+        self.goto(end_x, end_y)
+
+    def draw_rect(self, rect: Rect):
+        self.penup()
+        self.goto(rect.left, rect.top)
+        self.pendown()
+        self.setx(rect.right)
+        self.sety(rect.bottom)
+        self.setx(rect.left)
+        self.sety(rect.top)
+
+    def draw_textbox(self, textbox: TextBox):
+        self.pencolor(textbox.color)
+        if textbox.border_width:
+            self.pensize(textbox.border_width)
+            self.draw_rect(textbox)
+        self.write_text(textbox.text, textbox.center_x, textbox.center_y, textbox.font_size)
+        self.pensize(GamePen.DEFAULT_SIZE)
+        self.pencolor("black")
+
+    @wrap(queued)
+    def draw_grid(self, grid: Grid):
+        for col in range(1, grid.columns):
+            x = grid.left + grid.cell_width * col
+            self.draw_line(x, grid.top, x, grid.bottom)
+        for row in range(1, grid.rows):
+            y = grid.top - grid.cell_width * row
+            self.draw_line(grid.left, y, grid.right, y)
+
+    def draw_o(self, cell: Cell):
+        marker_rect = cell.marker_rect
+        radius = marker_rect.width / 2
+        self.penup()
+        self.goto(cell.center_x, marker_rect.bottom)
+        self.pendown()
+        self.speed(0)
+        divisions = 10
+        for _ in range(divisions):
+            self.circle(radius, extent=360/divisions)
+        self.speed(GamePen.DEFAULT_SPEED)
+
+    def draw_x(self, cell: Cell):
+        marker_rect = cell.marker_rect
+        self.draw_line(marker_rect.left, marker_rect.top, marker_rect.right, marker_rect.bottom)
+        self.draw_line(marker_rect.right, marker_rect.top, marker_rect.left, marker_rect.bottom)
+
+    def get_marker_shape(self, marker, radius):
+        """Registers the polygon of a marker of the given size once and returns its name"""
+        name = f"{marker}{radius:g}"
+        screen = self.getscreen()
+        if name not in screen.getshapes():
+            if marker == MARKER.X:
+                points = ((-radius, -radius), (radius, radius), (0, 0), (-radius, radius), (radius, -radius), (0, 0))
+            else:
+                angles = [2 * math.pi * i / GamePen.CIRCLE_POINTS for i in range(GamePen.CIRCLE_POINTS)]
+                points = tuple((radius * math.cos(angle), radius * math.sin(angle)) for angle in angles)
+            screen.register_shape(name, points)
+        return name
+
+    def stamp_marker(self, cell: Cell, player: Player):
+        self.penup()
+        self.goto(cell.center_x, cell.center_y)
+        self.setheading(0)
+        self.shape(self.get_marker_shape(player.marker, cell.marker_rect.width / 2))
+        self.color(player.color, "")
+        self.shapesize(outline=GamePen.DEFAULT_SIZE)
+        self.stamp()
+        self.shape("circle")
+        self.fillcolor("black")
+        self.resizemode("noresize")
+
+    @wrap(queued)
+    def mark(self, cell: Cell, player: Player):
+        if not self.animate:
+            self.stamp_marker(cell, player)
+            return
+        self.pencolor(player.color)
+        if player.marker == MARKER.X:
+            self.draw_x(cell)
+        elif player.marker == MARKER.O:
+            self.draw_o(cell)
+
+    @wrap(queued)
+    def strikethrough(self, cells, cond, color):
+        self.pencolor(color)
+        self.pensize(5)
+        if cond == "row":
+            left = cells[0].left
+            right = cells[-1].right
+            y = cells[0].center_y
+            self.draw_line(left, y, right, y)
+        elif cond == "column":
+            top = cells[0].top
+            bottom = cells[-1].bottom
+            x = cells[0].center_x
+            self.draw_line(x, top, x, bottom)
+        elif cond == "ascending diagonal":
+            right = cells[0].right
+            top = cells[0].top
+            left = cells[-1].left
+            bottom = cells[-1].bottom
+            self.draw_line(right, top, left, bottom)
+        elif cond == "descending diagonal":
+            left = cells[0].left
+            top = cells[0].top
+            right = cells[-1].right
+            bottom = cells[-1].bottom
+            self.draw_line(left, top, right, bottom)
+        self.pensize(GamePen.DEFAULT_SIZE)
+
+    def get_writer(self, textbox: TextBox):
+        """Returns a turtle of its own for the textbox, so it can be redrawn without clearing the screen"""
+        writer = self.writers.get(textbox)
+        if writer is None:
+            writer = self.writers[textbox] = Turtle(visible=False)
+            writer.penup()
+        return writer
+
+    @wrap(draw_instantly)
+    def redraw_textboxes(self, textboxes):
+        for textbox in textboxes:
+            writer = self.get_writer(textbox)
+            writer.clear()
+            writer.pencolor(textbox.color)
+            writer.goto(textbox.center_x, textbox.center_y - textbox.font_size * 0.75)
+            writer.write(textbox.text, align="center", font=('Arial', textbox.font_size, 'normal'))
+
+    @wrap(draw_instantly)
+    def draw_menu_screen(self, menu_screen: Menu):
+        self.clear_all()
+        self.draw_textbox(menu_screen.title)
+        for switch in menu_screen.settings.switches.values():
+            self.draw_textbox(switch.textbox)
+        self.draw_textbox(menu_screen.start_button)
+        self.redraw_textboxes(menu_screen.settings.get_textboxes())
+
+    @wrap(draw_instantly)
+    def draw_game_over_screen(self, over_screen: GameOver):
+        for textbox in [over_screen.message, over_screen.play, over_screen.menu]:
+            self.draw_textbox(textbox)
+
+
+class ComputerTurn:
+    """Searches for the computer's move on a worker thread so the window keeps responding"""
+    def __init__(self, computer: Computer, grid: Grid):
+        self.computer = computer
+        self.grid = grid.copy()
+        self.cell = None
+        self.best = None
+        self.cancelled = False
+        # A new event every turn, so a cancel that comes before the search starts is not lost
+        self.stop = threading.Event()
+        self.deadline = time.perf_counter() + computer.time_budget * 2
+        self.thread = threading.Thread(target=self.search, daemon=True)
+        self.thread.start()
+
+    def search(self):
+        self.cell = self.computer.choose_cell(self.grid, on_best=self.set_best, cancel=self.stop)
+
+    def set_best(self, cell):
+        self.best = cell
+
+    def get_cell(self):
+        """Returns the chosen cell, or the best so far once the time budget is well overdue"""
+        if self.cell is None and self.best is not None and time.perf_counter() > self.deadline:
+            self.stop.set()
+            return self.best
+        return self.cell
+
+    def cancel(self):
+        self.cancelled = True
+        self.stop.set()
+        self.thread.join()
+
+
+class STATE:
+    MENU = 1
+    PLAY = 2
+    GAME_OVER = 3
+
+
+class Game:
+    POLL_INTERVAL = 20
+
+    def __init__(self, rows=3, columns=3, win_length=3, instrumentation=None, animate=True, workers=None,
+                 game_log=None):
+        self.screen = GameScreen(onclick=self.click_handler)
+        self.screen.onkey(self.return_to_menu, "Escape")
+        self.screen.listen()
+        self.pen = GamePen(animate)
+        self.menu = Menu()
+        self.board_size = (rows, columns, win_length)
+        self.grid = Grid(*self.board_size)
+        self.game_over = GameOver()
+        self.player = Player()
+        self.instrumentation = instrumentation
+        self.executor = ProcessPoolExecutor(workers) if workers else None
+        self.computer = Computer(instrumentation=instrumentation, executor=self.executor)
+        # One table per difficulty level, since a depth limit changes the scores
+        self.tables = {self.computer.level: self.computer.table}
+        self.computer_turn_task = None
+        # The last turn that returned its best cell so far, whose thread may still be stopping
+        self.overdue_turn = None
+        self.game_log = game_log
+        self.turn_start = time.perf_counter()
+        self.current_player = self.get_fist_player()
+        self.state = STATE.MENU
+        self.draw_menu()
+
+    def run(self):
+        self.screen.mainloop()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+        if self.game_log is not None:
+            self.game_log.close()
+
+    def get_fist_player(self):
+        return self.player if self.player.order == "first" else self.computer
+
+    def reset(self):
+        self.cancel_computer_turn()
+        self.grid.clear()
+        self.current_player = self.get_fist_player()
+
+    def change_current_player(self):
+        self.current_player = self.player if self.current_player == self.computer else self.computer
+
+    def play_move(self, cell):
+        if self.game_log is not None:
+            self.game_log.add_move(cell, time.perf_counter() - self.turn_start)
+        self.turn_start = time.perf_counter()
+        cell.marker = self.current_player.marker
+        self.pen.mark(cell, self.current_player)
+        self.grid.log_cells()
+        # check if they won
+        win, cells, cond = self.grid.check_win(self.current_player.marker)
+        if win:
+            self.pen.strikethrough(cells, cond, self.current_player.color)
+            if self.current_player == self.player:
+                self.end_game("you win!", "player")
+            else:
+                self.end_game("you lose", "computer")
+        elif self.grid.check_tie():
+            self.end_game("tie", "tie")
+        else:
+            # continue game
+            self.change_current_player()
+            if self.current_player == self.computer:
+                self.computer_turn()
+
+    def computer_turn(self):
+        # Computers share their transposition tables, so only one search may run at a time
+        if self.overdue_turn is not None:
+            self.overdue_turn.thread.join()
+            self.overdue_turn = None
+        self.computer_turn_task = ComputerTurn(self.computer, self.grid)
+        self.screen.ontimer(self.check_computer_turn, Game.POLL_INTERVAL)
+
+    def check_computer_turn(self):
+        task = self.computer_turn_task
+        if task is None or task.cancelled:
+            return
+        cell = task.get_cell()
+        if cell is None:
+            self.screen.ontimer(self.check_computer_turn, Game.POLL_INTERVAL)
+            return
+        self.computer_turn_task = None
+        if task.thread.is_alive():
+            self.overdue_turn = task
+        task.grid.log_scores()
+        self.play_move(self.grid.cells[cell.row][cell.col])
+        self.pen.flush()
+
+    def cancel_computer_turn(self):
+        if self.computer_turn_task is not None:
+            self.computer_turn_task.cancel()
+            self.computer_turn_task = None
+
+    def start_game(self):
+        self.pen.clear_all()
+        self.state = STATE.PLAY
+        if self.game_log is not None:
+            self.game_log.start(self.grid, self.player, self.computer)
+        self.turn_start = time.perf_counter()
+        self.pen.draw_grid(self.grid)
+        if self.current_player == self.computer:
+            if self.grid.is_classic():
+                self.play_move(self.grid.all_cells()[0])
+            else:
+                self.computer_turn()
+
+    def draw_menu(self):
+        self.pen.draw_menu_screen(self.menu)
+
+    def return_to_menu(self):
+        if self.state == STATE.PLAY:
+            if self.game_log is not None:
+                self.game_log.finish(None)
+            self.reset()
+            self.pen.queue.clear()
+        self.draw_menu()
+        self.state = STATE.MENU
+
+    def end_game(self, condition, result):
+        if self.game_log is not None:
+            self.game_log.finish(result)
+        self.state = STATE.GAME_OVER
+        self.game_over = GameOver(condition)
+        self.pen.draw_game_over_screen(self.game_over)
+        self.reset()
+
+    def menu_handler(self, x, y):
+        button_name = self.menu.get_clicked_button(x, y)
+        if button_name in self.menu.settings.list:
+            self.pen.redraw_textboxes(self.menu.switch_setting(button_name))
+            self.player = Player(marker=self.menu.settings.player.get("marker").value,
+                                 color=self.menu.settings.player.get("color").value,
+                                 order=self.menu.settings.player.get("order").value)
+            self.computer = self.create_computer()
+            self.current_player = self.get_fist_player()
+        elif button_name == "start":
+            self.start_game()
+
+    def create_computer(self):
+        settings = self.menu.settings.computer
+        marker = settings.get("marker").value
+        color = settings.get("color").value
+        order = settings.get("order").value
+        level = settings.get("level").value
+        if settings.get("agent").value == MonteCarloPlayer.AGENT:
+            return MonteCarloPlayer.at_level(level, marker, color, order)
+        table = self.tables.setdefault(level, TranspositionTable())
+        return Computer.at_level(level, marker, color, order, table=table, instrumentation=self.instrumentation,
+                                 executor=self.executor)
+
+    def game_handler(self, x, y):
+        if self.current_player != self.player:
+            return
+        cell = self.grid.get_clicked_cell(x, y)
+        if cell is not None and cell.is_unmarked():
+            self.play_move(cell)
+
+    def game_over_handler(self, x, y):
+        button_name = self.game_over.get_clicked_button(x, y)
+        if button_name == "play":
+            self.start_game()
+        elif button_name == "menu":
+            self.return_to_menu()
+
+    def click_handler(self, x, y):
+        if not self.screen.enable_clicks:
+            return
+        self.screen.enable_clicks = False
+        if self.state == STATE.MENU:
+            self.menu_handler(x, y)
+        elif self.state == STATE.PLAY:
+            self.game_handler(x, y)
+        elif self.state == STATE.GAME_OVER:
+            self.game_over_handler(x, y)
+        self.pen.flush()
+        self.screen.enable_clicks = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tic Tac Toe in Python Turtle")
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--columns", type=int, default=3)
+    parser.add_argument("--win-length", type=int, default=3, help="markers in a line needed to win")
+    parser.add_argument("--no-animation", dest="animate", action="store_false",
+                        help="draw every move in a single frame instead of animating it")
+    parser.add_argument("--log-level", default="WARNING", help="DEBUG prints the board and move scores")
+    tracing = parser.add_mutually_exclusive_group()
+    tracing.add_argument("--instrument", metavar="FILE", help="append search statistics to FILE as JSON lines")
+    tracing.add_argument("--search-tree", metavar="FILE",
+                         help="append every position the computer scores on the 3x3 board to FILE as JSON lines")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes to search the computer's moves on in parallel")
+    parser.add_argument("--record", metavar="FILE", help="append a record of every game to FILE as JSON lines")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
+    instrumentation = None
+    if args.instrument:
+        from instrument import Instrumentation
+        instrumentation = Instrumentation(args.instrument)
+    elif args.search_tree:
+        from searchtree import SearchTree
+        instrumentation = SearchTree(args.search_tree)
+    game_log = None
+    if args.record:
+        from records import GameLog
+        game_log = GameLog(args.record)
+    game = Game(args.rows, args.columns, args.win_length, instrumentation, args.animate, args.workers, game_log)
+    game.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Opt-in statistics for the computer's move search, written as JSON lines.
+
+Pass ``Computer(instrumentation=Instrumentation("search.jsonl"))`` to record one
+line per choose_cell call.
+"""
+import json
+import sys
+import time
+
+
+class SearchStats:
+    def __init__(self, table):
+        self.start = time.perf_counter()
+        self.source = None
+        self.nodes = 0
+        self.max_depth = 0
+        self.check_win_calls = 0
+        self.winning_cells_calls = 0
+        self.candidates = []
+        self.table = table
+        self.table_hits = table.hits
+        self.table_misses = table.misses
+
+    def count_calls(self, func, counter):
+        def wrapper(*args):
+            setattr(self, counter, getattr(self, counter) + 1)
+            return func(*args)
+        return wrapper
+
+    def count_nodes(self, evaluate):
+        def wrapper(own, opp, turn):
+            self.nodes += 1
+            self.max_depth = max(self.max_depth, turn)
+            return evaluate(own, opp, turn)
+        return wrapper
+
+    def add_candidate(self, cell, start):
+        self.candidates.append({"cell": [cell.row, cell.col], "score": cell.score, "time": time.perf_counter() - start})
+
+    def get_record(self, computer, grid, cell):
+        hits = self.table.hits - self.table_hits
+        misses = self.table.misses - self.table_misses
+        return {
+            "marker": computer.marker,
+            "board": grid.to_string(),
+            "source": self.source,
+            "cell": [cell.row, cell.col],
+            "time": time.perf_counter() - self.start,
+            "nodes": self.nodes,
+            "max_depth": self.max_depth,
+            "check_win_calls": self.check_win_calls,
+            "winning_cells_calls": self.winning_cells_calls,
+            "cache_hits": hits,
+            "cache_misses": misses,
+            "cache_hit_rate": hits / (hits + misses) if hits + misses else None,
+            "candidates": self.candidates,
+        }
+
+
+class JsonSink:
+    """Base of the instrumentations that write JSON lines to a file or stream"""
+    def __init__(self, sink=sys.stderr):
+        """``sink`` is a file name to append to or a writable text stream"""
+        self.sink = open(sink, "a") if isinstance(sink, str) else sink
+
+    def close(self):
+        if self.sink not in (sys.stdout, sys.stderr):
+            self.sink.close()
+
+
+class Instrumentation(JsonSink):
+    def start(self, computer):
+        """Counts the search calls of the computer until stop is called"""
+        stats = SearchStats(computer.table)
+        computer.evaluate = stats.count_nodes(computer.evaluate)
+        computer.has_won = stats.count_calls(computer.has_won, "check_win_calls")
+        computer.get_winning_cells = stats.count_calls(computer.get_winning_cells, "winning_cells_calls")
+        return stats
+
+    @staticmethod
+    def stop(computer):
+        del computer.evaluate, computer.has_won, computer.get_winning_cells
+
+    def record(self, computer, stats, grid, cell):
+        if stats.source == "alpha-beta":
+            stats.nodes = computer.engine.nodes
+            stats.max_depth = computer.engine.depth
+        self.emit(stats.get_record(computer, grid, cell))
+
+    def emit(self, record):
+        self.sink.write(json.dumps(record) + "\n")
+        self.sink.flush()
@@ -0,0 +1,94 @@
+"""Load test for server.py: plays random games over many connections at once.
+
+Start the server first, then run e.g. ``python loadtest.py --sessions 2000 --connections 200``.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmark import get_latencies
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, **request):
+        self.writer.write(json.dumps(request).encode() + b"\n")
+        await self.writer.drain()
+        response = json.loads(await self.reader.readline())
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        return response
+
+    async def play_game(self, rng, latencies, rows, columns, win_length):
+        """Plays one game with random moves, recording how long every move took to answer"""
+        order = rng.choice(["first", "second"])
+        state = await self.request(op="new", order=order, rows=rows, columns=columns, win_length=win_length)
+        while state["winner"] is None:
+            empty = [i for i, marker in enumerate(state["board"]) if marker == "."]
+            row, col = divmod(rng.choice(empty), columns)
+            start = time.perf_counter()
+            state = await self.request(op="move", session=state["session"], row=row, col=col)
+            latencies.append(time.perf_counter() - start)
+        await self.request(op="close", session=state["session"])
+        return state["winner"]
+
+
+async def connect(host, port, unix):
+    if unix:
+        return await asyncio.open_unix_connection(unix)
+    return await asyncio.open_connection(host, port)
+
+
+async def run_connection(address, games, seed, latencies, results, board):
+    client = Client(*await connect(*address))
+    rng = random.Random(seed)
+    try:
+        for _ in range(games):
+            winner = await client.play_game(rng, latencies, *board)
+            results[winner] = results.get(winner, 0) + 1
+    finally:
+        client.writer.close()
+
+
+async def run(address, sessions, connections, board, seed=0):
+    latencies = []
+    results = {}
+    shares = [sessions // connections + (i < sessions % connections) for i in range(connections)]
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        run_connection(address, games, f"{seed}:{i}", latencies, results, board)
+        for i, games in enumerate(shares) if games
+    ])
+    return time.perf_counter() - start, latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="connect to a Unix socket instead of TCP")
+    parser.add_argument("-n", "--sessions", type=int, default=1000, help="games to play in total")
+    parser.add_argument("-c", "--connections", type=int, default=100, help="connections playing at once")
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--columns", type=int, default=3)
+    parser.add_argument("--win-length", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    address = (args.host, args.port, args.unix)
+    board = (args.rows, args.columns, args.win_length)
+    elapsed, latencies, results = asyncio.run(run(address, args.sessions, args.connections, board, args.seed))
+    print(f"{args.sessions} sessions in {elapsed:.2f}s ({args.sessions / elapsed:.0f} sessions/s)")
+    print(f"{len(latencies)} moves, latency " + "  ".join(
+        f"{name} {value * 1000:.1f}ms" for name, value in get_latencies(latencies).items()
+    ))
+    print("results " + "  ".join(f"{winner} {count}" for winner, count in sorted(results.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,76 @@
-from turtle import Turtle, TurtleScreen, Screen
+import logging
+import math
+import random
+import time
+from collections import OrderedDict
 
+import bitboard
+import mcts
+import search
+import tablebase
 
-def wrap(method):
-    """Calls a decorator that is defined as a static method"""
-    def caller(func_to_be_wrapped):
-        decorator_raw = method.__func__
-        return decorator_raw(func_to_be_wrapped)  # returns wrapper defined in the decorator
-    return caller
+logger = logging.getLogger(__name__)
+
+_worker_computer = None
 
 
 class Rect:
+    __slots__ = ("left", "top", "right", "bottom")
+
     def __init__(self, left, top, right, bottom):
         self.left = left
         self.top = top
         self.right = right
         self.bottom = bottom
-        self.width = right - left
-        self.height = top - bottom
-        self.center_x = left + self.width / 2
-        self.center_y = bottom + self.height / 2
+
+    @property
+    def width(self):
+        return self.right - self.left
+
+    @property
+    def height(self):
+        return self.top - self.bottom
+
+    @property
+    def center_x(self):
+        return (self.left + self.right) / 2
+
+    @property
+    def center_y(self):
+        return (self.bottom + self.top) / 2
 
     def has_inside(self, x, y):
         return self.left <= x <= self.right and self.bottom <= y <= self.top
 
 
+class HitIndex:
+    """Finds the rect under a point by only checking the rects in the same bucket of a uniform grid"""
+    BUCKET_SIZE = 40
+
+    def __init__(self, rects, bucket_size=BUCKET_SIZE):
+        self.bucket_size = bucket_size
+        self.buckets = {}
+        for rect in rects:
+            for key in self.get_bucket_keys(rect):
+                self.buckets.setdefault(key, []).append(rect)
+
+    def get_bucket_keys(self, rect: Rect):
+        size = self.bucket_size
+        for i in range(math.floor(rect.left / size), math.floor(rect.right / size) + 1):
+            for j in range(math.floor(rect.bottom / size), math.floor(rect.top / size) + 1):
+                yield i, j
+
+    def get_rect(self, x, y):
+        """Returns the first rect added that contains the point, or None"""
+        key = (math.floor(x / self.bucket_size), math.floor(y / self.bucket_size))
+        for rect in self.buckets.get(key, ()):
+            if rect.has_inside(x, y):
+                return rect
+
+
 class TextBox(Rect):
+    __slots__ = ("text", "border_width", "font_size", "color")
+
     def __init__(self, text: str, x, y, width=0, height=0, border_width=0, font_size=15, color="black"):
         super().__init__(
             left=x - width / 2,
@@ -39,119 +85,218 @@ class TextBox(Rect):
 
 
 class Button(TextBox):
+    __slots__ = ("name",)
+
     def __init__(self, name, text: str, x, y, width, height, border_width, font_size=15):
         super().__init__(text, x, y, width, height, border_width, font_size)
         self.name = name
 
 
 class Cell(Rect):
+    __slots__ = ("row", "col", "grid", "_marker", "score")
     WIDTH = 40
     PADDING = 5
 
-    def __init__(self, row, col):
+    def __init__(self, row, col, grid):
         self.row = row
         self.col = col
+        self.grid = grid
+        width = grid.cell_width
         super().__init__(
-            left=Grid.LEFT + Cell.WIDTH * col,
-            top=Grid.TOP - Cell.WIDTH * row,
-            right=Grid.LEFT + Cell.WIDTH * (col + 1),
-            bottom=Grid.TOP - Cell.WIDTH * (row + 1)
-        )
-        self.marker_rect = Rect(
-            left=self.left + Cell.PADDING,
-            top=self.top - Cell.PADDING,
-            right=self.right - Cell.PADDING,
-            bottom=self.bottom + Cell.PADDING
+            left=grid.left + width * col,
+            top=grid.top - width * row,
+            right=grid.left + width * (col + 1),
+            bottom=grid.top - width * (row + 1)
         )
-        self.marker = None
+        self._marker = None
         self.score = 0
 
+    @property
+    def marker_rect(self):
+        """The area the marker is drawn in, inside the cell's padding"""
+        padding = Cell.PADDING * self.grid.cell_width / Cell.WIDTH
+        return Rect(
+            left=self.left + padding,
+            top=self.top - padding,
+            right=self.right - padding,
+            bottom=self.bottom + padding
+        )
+
+    @property
+    def marker(self):
+        return self._marker
+
+    @marker.setter
+    def marker(self, marker):
+        old_marker = self._marker
+        if marker != old_marker:
+            self._marker = marker
+            self.grid.update_lines(self, old_marker, marker)
+
     def is_unmarked(self):
-        return self.marker is None
+        return self._marker is None
 
 
 class Grid(Rect):
-    LEFT = -Cell.WIDTH * 3 / 2
-    TOP = Cell.WIDTH * 3 / 2
-    RIGHT = Cell.WIDTH * 3 / 2
-    BOTTOM = -Cell.WIDTH * 3 / 2
+    __slots__ = ("rows", "columns", "win_length", "cell_width", "cells", "cell_list", "geometry", "unmarked_count",
+                 "line_occupancy", "line_counts", "completed_lines", "threat_lines", "winning_cells")
+    MAX_WIDTH = 240
+
+    def __init__(self, rows=3, columns=3, win_length=3):
+        self.rows = rows
+        self.columns = columns
+        self.win_length = win_length
+        self.cell_width = min(Cell.WIDTH, Grid.MAX_WIDTH / max(rows, columns))
+        super().__init__(
+            left=-self.cell_width * columns / 2,
+            top=self.cell_width * rows / 2,
+            right=self.cell_width * columns / 2,
+            bottom=-self.cell_width * rows / 2
+        )
+        self.cells = [[Cell(row, col, self) for col in range(columns)] for row in range(rows)]
+        self.cell_list = tuple(cell for row in self.cells for cell in row)
+        # The win lines are shared by every grid of the same size, as cell indices into cell_list
+        self.geometry = bitboard.get_geometry(rows, columns, win_length)
+        self.clear_lines()
+
+    def clear_lines(self):
+        # Markers in each line, kept up to date as cells are marked and unmarked
+        self.unmarked_count = self.rows * self.columns
+        self.line_occupancy = [0] * len(self.geometry.lines)
+        self.line_counts = {}
+        self.completed_lines = {}
+        self.threat_lines = {}
+        # get_winning_cells results until the next marker changes
+        self.winning_cells = {}
+
+    def clear(self):
+        """Unmarks every cell in place, so the grid can be reused for a new game"""
+        for cell in self.cell_list:
+            cell._marker = None
+            cell.score = 0
+        self.clear_lines()
+
+    def update_lines(self, cell, old_marker, new_marker):
+        self.winning_cells.clear()
+        if old_marker is None:
+            self.unmarked_count -= 1
+        if new_marker is None:
+            self.unmarked_count += 1
+        for marker in (old_marker, new_marker):
+            if marker is not None and marker not in self.line_counts:
+                self.line_counts[marker] = [0] * len(self.geometry.lines)
+                self.completed_lines[marker] = set()
+                self.threat_lines[marker] = set()
+        threat_count = self.win_length - 1
+        for line in self.geometry.cell_line_indices[cell.row * self.columns + cell.col]:
+            if old_marker is not None:
+                self.line_counts[old_marker][line] -= 1
+                self.line_occupancy[line] -= 1
+            if new_marker is not None:
+                self.line_counts[new_marker][line] += 1
+                self.line_occupancy[line] += 1
+            for marker, counts in self.line_counts.items():
+                count = counts[line]
+                if count == self.win_length:
+                    self.completed_lines[marker].add(line)
+                else:
+                    self.completed_lines[marker].discard(line)
+                if count == threat_count and self.line_occupancy[line] == threat_count:
+                    self.threat_lines[marker].add(line)
+                else:
+                    self.threat_lines[marker].discard(line)
 
-    def __init__(self):
-        super().__init__(Grid.LEFT, Grid.TOP, Grid.RIGHT, Grid.BOTTOM)
-        self.cells = [[Cell(row, col) for col in range(3)] for row in range(3)]
+    def copy(self):
+        grid = Grid(self.rows, self.columns, self.win_length)
+        for cell, copied in zip(self.cell_list, grid.cell_list):
+            copied.marker = cell.marker
+        return grid
 
-    def print_cells(self):
-        for row in range(3):
-            print([cell.marker for cell in self.cells[row]])
+    def is_classic(self):
+        return (self.rows, self.columns, self.win_length) == (3, 3, 3)
 
-    def print_scores(self):
-        for row in range(3):
-            print([cell.score for cell in self.cells[row]])
+    def to_string(self):
+        """Returns the markers in row-major order, with a dot for an unmarked cell"""
+        return "".join(cell.marker or "." for cell in self.cell_list)
+
+    def log_cells(self):
+        if logger.isEnabledFor(logging.DEBUG):
+            for row in range(self.rows):
+                logger.debug([cell.marker for cell in self.cells[row]])
+
+    def log_scores(self):
+        if logger.isEnabledFor(logging.DEBUG):
+            for row in range(self.rows):
+                logger.debug([cell.score for cell in self.cells[row]])
 
     def all_cells(self):
-        return [cell for row in self.cells for cell in row]
+        return list(self.cell_list)
 
     def clear_scores(self):
-        for cell in self.all_cells():
+        for cell in self.cell_list:
             cell.score = 0
 
     def get_unmarked_cells(self):
-        return [cell for cell in self.all_cells() if cell.is_unmarked()]
+        return [cell for cell in self.cell_list if cell.is_unmarked()]
+
+    def get_bitboard(self, marker):
+        bits = 0
+        for index, cell in enumerate(self.cell_list):
+            if cell.marker == marker:
+                bits |= 1 << index
+        return bits
+
+    def get_cell(self, bit):
+        return self.cell_list[bitboard.cell_index(bit)]
 
     def get_clicked_cell(self, x, y):
-        for cell in self.all_cells():
-            if cell.has_inside(x, y):
-                return cell
+        if not self.has_inside(x, y):
+            return None
+        # A click on the line between two cells goes to the cell above or to the left
+        col = min(max(math.ceil((x - self.left) / self.cell_width) - 1, 0), self.columns - 1)
+        row = min(max(math.ceil((self.top - y) / self.cell_width) - 1, 0), self.rows - 1)
+        return self.cells[row][col]
 
     def get_row(self, row):
         return self.cells[row]
 
     def get_column(self, column):
-        return [self.cells[row][column] for row in range(3)]
+        return [self.cells[row][column] for row in range(self.rows)]
 
     def get_ascending_diagonal(self):
-        return [self.cells[i][2 - i] for i in range(3)]
+        size = min(self.rows, self.columns)
+        return [self.cells[i][size - 1 - i] for i in range(size)]
 
     def get_descending_diagonal(self):
-        return [self.cells[i][i] for i in range(3)]
+        return [self.cells[i][i] for i in range(min(self.rows, self.columns))]
 
     def check_tie(self):
-        return len(self.get_unmarked_cells()) == 0
+        return self.unmarked_count == 0
 
     def check_win(self, marker):
-        for row in range(3):
-            checklist = self.get_row(row)
-            if all([marker == cell.marker for cell in checklist]):
-                return True, checklist, "row"
-        for column in range(3):
-            checklist = self.get_column(column)
-            if all([marker == cell.marker for cell in checklist]):
-                return True, checklist, "column"
-        checklist = self.get_ascending_diagonal()
-        if all([marker == cell.marker for cell in checklist]):
-            return True, checklist, "ascending diagonal"
-        checklist = self.get_descending_diagonal()
-        if all([marker == cell.marker for cell in checklist]):
-            return True, checklist, "descending diagonal"
+        completed_lines = self.completed_lines.get(marker)
+        if completed_lines:
+            line = min(completed_lines)
+            checklist = [self.cell_list[index] for index in self.geometry.line_indices[line]]
+            return True, checklist, self.geometry.line_names[line]
         return False, None, None
 
     def get_winning_cells(self, marker):
-        winning_cells = []
-
-        def get_winning_cell_in_list(checklist):
-            if sum([marker == cell.marker for cell in checklist]) == 2:
-                for cell in checklist:
-                    if cell.is_unmarked():
-                        winning_cells.append(cell)
-
-        for row in range(3):
-            row_list = self.get_row(row)
-            get_winning_cell_in_list(row_list)
-        for column in range(3):
-            column_list = self.get_column(column)
-            get_winning_cell_in_list(column_list)
-        get_winning_cell_in_list(self.get_ascending_diagonal())
-        get_winning_cell_in_list(self.get_descending_diagonal())
+        """Returns a tuple of the empty cell of every line the marker is one short of completing"""
+        winning_cells = self.winning_cells.get(marker)
+        if winning_cells is None:
+            threat_lines = self.threat_lines.get(marker)
+            winning_cells = ()
+            if threat_lines:
+                cell_list = self.cell_list
+                line_indices = self.geometry.line_indices
+                unmarked = []
+                for line in sorted(threat_lines):
+                    for index in line_indices[line]:
+                        if cell_list[index].is_unmarked():
+                            unmarked.append(cell_list[index])
+                winning_cells = tuple(unmarked)
+            self.winning_cells[marker] = winning_cells
         return winning_cells
 
 
@@ -163,38 +308,196 @@ class MARKER:
 
 
 class Player:
+    AGENT = "human"
+    # Keyword arguments of each difficulty level, for the players that have them
+    LEVELS = {}
+
     def __init__(self, marker=MARKER.O, color=MARKER.BLUE, order="second"):
         self.marker = marker
         self.color = color
         self.order = order
+        self.agent = self.AGENT
         self.opponent_marker = MARKER.X if self.marker == MARKER.O else MARKER.O
 
+    @classmethod
+    def at_level(cls, level, *args, **kwargs):
+        """Creates a player with the settings of a difficulty level from LEVELS"""
+        return cls(*args, **kwargs, **cls.LEVELS[level], level=level)
+
+
+class TranspositionTable:
+    """LRU cache of Computer scores keyed on positions and their symmetries"""
+    DEFAULT_SIZE = 100000
+
+    def __init__(self, max_size=DEFAULT_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def get_keys(own, opp, turn):
+        # The lowest bit tells a key shared by all symmetries of the board from a key for this board only
+        symmetric_key = (bitboard.canonical(own, opp) << 4 | turn) << 1
+        exact_key = ((own << 9 | opp) << 4 | turn) << 1 | 1
+        return symmetric_key, exact_key
+
+    def lookup(self, own, opp, turn):
+        for key in self.get_keys(own, opp, turn):
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def store(self, own, opp, turn, score, symmetric):
+        symmetric_key, exact_key = self.get_keys(own, opp, turn)
+        self.entries[symmetric_key if symmetric else exact_key] = score, symmetric
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def score_move(own, opp):
+    """Runs in a worker process: scores a candidate move of the classic board for the player of ``own``"""
+    global _worker_computer
+    if _worker_computer is None:
+        _worker_computer = Computer(use_tablebase=False)
+    return _worker_computer.get_score(own, opp)
+
 
 class Computer(Player):
-    def __init__(self, marker=MARKER.X, color=MARKER.RED, order="first"):
+    AGENT = "minimax"
+    # On the 3x3 board the weaker levels settle for a draw and sometimes blunder, so they cost a
+    # tablebase lookup like hard does. Other boards, and the 3x3 board without a tablebase, limit the
+    # moves looked ahead, the positions searched per move and how close to the best score a random
+    # pick may be.
+    LEVELS = {
+        "easy": {"search_depth": 1, "max_nodes": 200, "tolerance": 0.5,
+                 "min_value": tablebase.VALUE.DRAW, "blunder_rate": 0.2},
+        "medium": {"search_depth": 3, "max_nodes": 5000, "tolerance": 0.05, "min_value": tablebase.VALUE.DRAW},
+        "hard": {},
+    }
+    # Looked up through the instance so that Instrumentation can count the calls
+    has_won = staticmethod(bitboard.has_won)
+    get_winning_cells = staticmethod(bitboard.get_winning_cells)
+
+    def __init__(self, marker=MARKER.X, color=MARKER.RED, order="first", table=None, use_tablebase=True,
+                 time_budget=1.0, instrumentation=None, executor=None, search_depth=None, max_nodes=None,
+                 tolerance=0, min_value=None, blunder_rate=0, seed=None, level="hard"):
+        """``executor`` is a process pool to score the candidate moves on in parallel.
+
+        ``search_depth`` limits how many moves ahead the computer looks and ``max_nodes`` how many
+        positions it searches per move. With a depth limit that is reached in time, the chosen move
+        does not depend on the number of workers. A ``tolerance`` picks at random between the moves
+        whose score is that close to the best, as a fraction of the range of scores.
+
+        ``min_value`` and ``blunder_rate`` weaken the tablebase moves of the 3x3 board instead; see
+        probe_tablebase.
+        """
         super().__init__(marker, color, order,)
+        self.table = TranspositionTable() if table is None else table
+        self.tablebase = tablebase.get_default() if use_tablebase else None
+        self.time_budget = time_budget
+        self.executor = executor
+        self.search_depth = search_depth
+        self.max_nodes = max_nodes
+        self.tolerance = tolerance
+        self.min_value = min_value
+        self.blunder_rate = blunder_rate
+        self.random = random.Random(seed)
+        self.level = level
+        self.nodes = 0
+        self.instrumentation = instrumentation
+        self.engine = None
+        self.cancel = None
+
+    def is_limited(self):
+        return self.search_depth is not None or self.max_nodes is not None or bool(self.tolerance)
+
+    def get_engine(self, grid: Grid):
+        """Returns the alpha-beta search for boards other than the classic 3x3"""
+        if self.engine is None or self.engine.geometry is not grid.geometry:
+            limits = (self.search_depth, self.max_nodes, self.tolerance, self.random.random())
+            # The workers only check the node budget between depths, so a budget keeps the search serial
+            if self.executor is None or self.max_nodes is not None:
+                self.engine = search.AlphaBeta(grid.geometry, self.time_budget, *limits)
+            else:
+                self.engine = search.ParallelAlphaBeta(grid.geometry, self.executor, self.time_budget, *limits)
+        return self.engine
+
+    def probe_tablebase(self, own, opp):
+        """Returns the tablebase move, or None for a position the tablebase does not hold.
+
+        A ``min_value`` picks at random between the moves worth at least that much, or as much as the
+        best move if that is less, and ``blunder_rate`` is the chance of a random move instead.
+        """
+        value, move = self.tablebase.probe(own, opp)
+        if move is None or (self.min_value is None and not self.blunder_rate):
+            return move
+        moves = bitboard.get_unmarked_cells(own, opp)
+        if self.blunder_rate and self.random.random() < self.blunder_rate:
+            return self.random.choice(moves)
+        if self.min_value is None:
+            return move
+        least = min(value, self.min_value)
+        # A move is worth the opposite of the position it leaves the opponent to move in
+        return self.random.choice([
+            cell for cell in moves
+            if tablebase.VALUE.WIN + tablebase.VALUE.LOSS - self.tablebase.probe(opp, own | cell)[0] >= least
+        ])
+
+    def get_score(self, own, opp, turn=1):
+        """Scores the position given as bitboards of this computer's and the opponent's markers"""
+        return self.evaluate(own, opp, turn)[0]
+
+    def evaluate(self, own, opp, turn):
+        """Returns the score of the position and whether it is the same for every symmetry of the board"""
+        entry = self.table.lookup(own, opp, turn)
+        if entry is None:
+            entry = self.search(own, opp, turn)
+            self.table.store(own, opp, turn, *entry)
+        return entry
+
+    def search(self, own, opp, turn):
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise search.TimeUp
+        if self.cancel is not None and self.cancel.is_set():
+            raise search.TimeUp
 
-    def get_score(self, grid: Grid, score=0, turn=1):
         # Check if there's a tie
-        if grid.check_tie():
-            return score
+        if bitboard.is_full(own, opp):
+            return 0, True
 
         # Check if you have won
-        won, _, _ = grid.check_win(self.marker)
-        if won:
-            score += 10 ** (9 - turn)
-            return score
+        if self.has_won(own):
+            return 10 ** (9 - turn), True
 
         # Check if you are about to lose
-        losing_cells = grid.get_winning_cells(self.opponent_marker)
+        losing_cells = self.get_winning_cells(opp, own)
         about_to_lose = len(losing_cells) > 0
         if about_to_lose:
-            score -= len(losing_cells) * 10 ** (9 - turn)
-            return score
+            return -len(losing_cells) * 10 ** (9 - turn), True
 
+        # Past the depth limit, only wins and losses count
+        if self.search_depth is not None and turn > self.search_depth:
+            return 0, True
+
+        score = 0
+        symmetric = True
         next_turn = turn + 1
         # Check if you are about to win
-        winning_cells = grid.get_winning_cells(self.marker)
+        winning_cells = self.get_winning_cells(own, opp)
         about_to_win = len(winning_cells) > 0
         # Predict player's next turn
         if about_to_win:
@@ -202,55 +505,151 @@ class Computer(Player):
             # Check if you have created a trap
             if len(winning_cells) > 1:
                 score += 10 ** (9 - next_turn)
-                return score
+                return score, True
             # Predict that the player is going to block you
-            winning_cells[0].marker = self.opponent_marker
-            for cell in grid.get_unmarked_cells():
-                cell.marker = self.marker
-                score = self.get_score(grid, score, next_turn + 1)
-                cell.marker = None
-            winning_cells[0].marker = None
+            blocked = opp | winning_cells[0]
+            for cell in bitboard.get_unmarked_cells(own, blocked):
+                child_score, child_symmetric = self.evaluate(own | cell, blocked, next_turn + 1)
+                score += child_score
+                symmetric = symmetric and child_symmetric
         else:
-            for opponent_cell in grid.get_unmarked_cells():
-                opponent_cell.marker = self.opponent_marker
+            for opponent_cell in bitboard.get_unmarked_cells(own, opp):
+                reply = opp | opponent_cell
                 # Check if you are about to lose
-                losing_cells = grid.get_winning_cells(self.opponent_marker)
+                losing_cells = self.get_winning_cells(reply, own)
                 about_to_lose = len(losing_cells) > 0
                 if about_to_lose:
-                    losing_cells[0].marker = self.marker
-                    score = self.get_score(grid, score, next_turn + 1)
-                    losing_cells[0].marker = None
+                    # Blocking the first of several threats depends on the line order, not just the position
+                    if len(set(losing_cells)) > 1:
+                        symmetric = False
+                    child_score, child_symmetric = self.evaluate(own | losing_cells[0], reply, next_turn + 1)
+                    score += child_score
+                    symmetric = symmetric and child_symmetric
                 else:
-                    for cell in grid.get_unmarked_cells():
-                        cell.marker = self.marker
-                        score = self.get_score(grid, score, next_turn + 1)
-                        cell.marker = None
-                opponent_cell.marker = None
-        return score
+                    for cell in bitboard.get_unmarked_cells(own, reply):
+                        child_score, child_symmetric = self.evaluate(own | cell, reply, next_turn + 1)
+                        score += child_score
+                        symmetric = symmetric and child_symmetric
+        return score, symmetric
+
+    def choose_cell(self, grid: Grid, on_best=None, cancel=None):
+        """Returns the cell to mark. ``on_best`` is called with each better cell found while searching.
+
+        Setting the ``cancel`` event, from another thread, makes the search return its best cell so far.
+        """
+        self.cancel = cancel
+        if self.instrumentation is None:
+            return self.find_cell(grid, on_best=on_best)
+        stats = self.instrumentation.start(self)
+        try:
+            cell = self.find_cell(grid, stats, on_best)
+        finally:
+            self.instrumentation.stop(self)
+        self.instrumentation.record(self, stats, grid, cell)
+        return cell
 
-    def choose_cell(self, grid: Grid):
+    def find_cell(self, grid: Grid, stats=None, on_best=None):
         grid.clear_scores()
+        own = grid.get_bitboard(self.marker)
+        opp = grid.get_bitboard(self.opponent_marker)
+        if not grid.is_classic():
+            if stats is not None:
+                stats.source = "alpha-beta"
+            report = None if on_best is None else lambda move: on_best(grid.get_cell(move))
+            return grid.get_cell(self.get_engine(grid).choose(own, opp, report, self.cancel))
+        if self.tablebase is not None:
+            move = self.probe_tablebase(own, opp)
+            if move is not None:
+                if stats is not None:
+                    stats.source = "tablebase"
+                return grid.get_cell(move)
         options = grid.get_unmarked_cells()
-        for cell in options:
-            cell.marker = self.marker
-            cell.score = self.get_score(grid)
-            cell.marker = None
-        grid.print_scores()
-        return max(options, key=lambda option: option.score)
+        # The workers search at full strength, so a limited computer scores its moves itself, and
+        # instrumentation only sees the calls made in this process, so an instrumented one does too
+        if self.executor is None or self.is_limited() or stats is not None:
+            scores = (self.get_score(own | bitboard.cell_bit(cell.row, cell.col), opp) for cell in options)
+        else:
+            moves = [own | bitboard.cell_bit(cell.row, cell.col) for cell in options]
+            scores = self.executor.map(score_move, moves, [opp] * len(moves))
+        self.nodes = 0
+        scored = {}
+        # Instrumentations that do not time the candidates leave out the hook
+        add_candidate = getattr(stats, "add_candidate", None)
+        start = time.perf_counter()
+        try:
+            for cell, score in zip(options, scores):
+                if self.cancel is not None and self.cancel.is_set():
+                    raise search.TimeUp
+                cell.score = scored[cell] = score
+                if add_candidate is not None:
+                    add_candidate(cell, start)
+                start = time.perf_counter()
+        except search.TimeUp:
+            # Out of nodes or cancelled: choose between the cells scored so far
+            if not scored:
+                scored[options[0]] = 0
+        if stats is not None:
+            stats.source = "search"
+        return search.choose_near_best(scored, self.tolerance, self.random)
+
+
+class RandomPlayer(Player):
+    AGENT = "random"
+
+    def __init__(self, marker=MARKER.X, color=MARKER.RED, order="first", seed=None):
+        super().__init__(marker, color, order)
+        self.random = random.Random(seed)
+
+    def choose_cell(self, grid: Grid):
+        return self.random.choice(grid.get_unmarked_cells())
+
+
+class MonteCarloPlayer(Player):
+    """Chooses moves by Monte Carlo tree search, within a number of playouts or a time budget"""
+    AGENT = "mcts"
+    LEVELS = {
+        "easy": {"playouts": 50},
+        "medium": {"playouts": 1000},
+        "hard": {},
+    }
+
+    def __init__(self, marker=MARKER.X, color=MARKER.RED, order="first", playouts=None, time_budget=1.0,
+                 seed=None, level="hard"):
+        super().__init__(marker, color, order)
+        self.playouts = playouts
+        self.time_budget = time_budget
+        self.seed = seed
+        self.level = level
+        self.engine = None
+
+    def get_engine(self, grid: Grid):
+        # The same engine for every move on the board, so its tree carries over
+        if self.engine is None or self.engine.geometry is not grid.geometry:
+            self.engine = mcts.MonteCarlo(grid.geometry, self.playouts, self.time_budget, self.seed)
+        return self.engine
+
+    def choose_cell(self, grid: Grid, on_best=None, cancel=None):
+        own = grid.get_bitboard(self.marker)
+        opp = grid.get_bitboard(self.opponent_marker)
+        report = None if on_best is None else lambda move: on_best(grid.get_cell(move))
+        return grid.get_cell(self.get_engine(grid).choose(own, opp, report, cancel))
 
 
 class Menu:
-    row_top = 30
-    row_spacing = 40
+    row_top = 45
+    row_spacing = 27
 
     def __init__(self):
-        self.title = TextBox("Tic Tac Toe", 0, 100, font_size=30)
+        self.title = TextBox("Tic Tac Toe", 0, 110, font_size=30)
         self.settings = Menu.Settings()
-        self.start_button = Button("start", "start", 0, -100, 80, 40, border_width=2)
+        start_y = Menu.row_top - Menu.row_spacing * len(self.settings.list) - 20
+        self.start_button = Button("start", "start", 0, start_y, 80, 40, border_width=2)
+        switches = [switch.textbox for switch in self.settings.switches.values()]
+        self.buttons = HitIndex(switches + [self.start_button])
 
     class SettingOption:
         def __init__(self, value, column=None, row=None, color="black"):
-            y = 60 if row is None else Menu.row_top - Menu.row_spacing * row
+            y = Menu.row_top + Menu.row_spacing if row is None else Menu.row_top - Menu.row_spacing * row
             col_spacing = 80
             x = -col_spacing if (column is None and value == "Player") or column == 0 else col_spacing
             self.value = value
@@ -266,8 +665,14 @@ class Menu:
             self.textbox = Button(setting, "switch", 0, y, width=50, height=20, border_width=1, font_size=10)
 
     class Settings:
+        # Settings only the computer has, which switch to the next choice instead of swapping with the player
+        CHOICES = {
+            "agent": [Computer.AGENT, MonteCarloPlayer.AGENT],
+            "level": list(Computer.LEVELS),
+        }
+
         def __init__(self):
-            self.list = ["marker", "color", "order"]
+            self.list = ["marker", "color", "order", "agent", "level"]
             self.player = dict.fromkeys(self.list)
             self.computer = dict.fromkeys(self.list)
             self.switches = dict.fromkeys(self.list)
@@ -279,22 +684,27 @@ class Menu:
             self.player["name"] = Menu.SettingOption("Player")
             self.computer["name"] = Menu.SettingOption("Computer")
             for row, setting in enumerate(self.list):
-                self.player[setting] = Menu.SettingOption(player[setting], 0, row, player["color"])
+                self.player[setting] = Menu.SettingOption(player.get(setting, ""), 0, row, player["color"])
                 self.computer[setting] = Menu.SettingOption(computer[setting], 1, row, computer["color"])
                 self.switches[setting] = Menu.SwitchButton(setting, row)
 
+        def get_textboxes(self, settings=None):
+            """Returns the player and computer textboxes of the given settings, or of every setting"""
+            settings = self.player.keys() if settings is None else settings
+            return [column[setting].textbox for column in (self.player, self.computer) for setting in settings]
+
     def get_clicked_button(self, x, y):
-        button_list = [
-            self.settings.switches.get("marker").textbox,
-            self.settings.switches.get("color").textbox,
-            self.settings.switches.get("order").textbox,
-            self.start_button
-        ]
-        for button in button_list:
-            if button.has_inside(x, y):
-                return button.name
+        button = self.buttons.get_rect(x, y)
+        if button is not None:
+            return button.name
 
     def switch_setting(self, change_setting):
+        """Swaps the player's and computer's setting and returns the textboxes that changed"""
+        choices = Menu.Settings.CHOICES.get(change_setting)
+        if choices is not None:
+            option = self.settings.computer[change_setting]
+            option.change_value(choices[(choices.index(option.value) + 1) % len(choices)])
+            return [option.textbox]
         player_old = self.settings.player[change_setting].value
         computer_old = self.settings.computer[change_setting].value
         self.settings.computer[change_setting].change_value(player_old)
@@ -303,6 +713,8 @@ class Menu:
             for setting in self.settings.list:
                 self.settings.player[setting].textbox.color = computer_old
                 self.settings.computer[setting].textbox.color = player_old
+            return self.settings.get_textboxes(self.settings.list)
+        return self.settings.get_textboxes([change_setting])
 
 
 class GameOver:
@@ -310,270 +722,22 @@ class GameOver:
         self.message = TextBox(condition, 0, 100, font_size=30)
         self.play = Button("play", "again", -60, -100, 80, 40, border_width=2)
         self.menu = Button("menu", "menu", 60, -100, 80, 40, border_width=2)
+        self.buttons = HitIndex([self.play, self.menu])
 
     def get_clicked_button(self, x, y):
-        for button in [self.play, self.menu]:
-            if button.has_inside(x, y):
-                return button.name
-
-
-class GameScreen(TurtleScreen):
-    def __new__(cls, *args, **kwargs):
-        instance = Screen()
-        instance.setup(300, 300)
-        instance.__class__ = cls
-        return instance
-
-    def __init__(self, onclick):
-        super().__init__(self.getcanvas())
-        self.onclick(onclick)
-        self.enable_clicks = True
-        try:
-            with open(".replit"):
-                self.getcanvas().winfo_toplevel().attributes('-fullscreen', True)
-        except FileNotFoundError:
-            self.screensize(250, 250)
-
+        button = self.buttons.get_rect(x, y)
+        if button is not None:
+            return button.name
 
-class GamePen(Turtle):
-    DEFAULT_SPEED = 6
-    DEFAULT_SIZE = 3
 
-    def __init__(self):
-        super().__init__()
-        self.shape("circle")
-        self.speed(GamePen.DEFAULT_SPEED)
-        self.pensize(GamePen.DEFAULT_SIZE)
-        self.hideturtle()
-        self.getscreen().delay(20)
-
-    @staticmethod
-    def show_turtle(func):
-        def wrapper(self: Turtle, *args, **kwargs):
-            self.showturtle()
-            func(self, *args, **kwargs)
-            self.hideturtle()
-        return wrapper
-
-    @staticmethod
-    def draw_instantly(func):
-        def wrapper(self: Turtle, *args, **kwargs):
-            self.getscreen().tracer(0)
-            func(self, *args, **kwargs)
-            self.getscreen().tracer(1)
-        return wrapper
-
-    def write_text(self, text: str, x, y, font_size):
-        self.up()
-        self.goto(x, y - font_size * 0.75)
-        self.write(text, align="center", font=('Arial', font_size, 'normal'))
-
-    def draw_line(self, start_x, start_y, end_x, end_y):
-        self.penup()
-        self.goto(start_x, start_y)
-        self.pendown()
-        self.goto(end_x, end_y)
-
-    def draw_rect(self, rect: Rect):
-        self.penup()
-        self.goto(rect.left, rect.top)
-        self.pendown()
-        self.setx(rect.right)
-        self.sety(rect.bottom)
-        self.setx(rect.left)
-        self.sety(rect.top)
-
-    def draw_textbox(self, textbox: TextBox):
-        self.pencolor(textbox.color)
-        if textbox.border_width:
-            self.pensize(textbox.border_width)
-            self.draw_rect(textbox)
-        self.write_text(textbox.text, textbox.center_x, textbox.center_y, textbox.font_size)
-        self.pensize(GamePen.DEFAULT_SIZE)
-        self.pencolor("black")
-
-    @wrap(show_turtle)
-    def draw_grid(self):
-        for i, j, down in [(x, y, y) if line < 2 else (y, x, y) for line, x in enumerate([1, 2] * 2) for y in [0, 3]]:
-            self.pen(pendown=bool(down))
-            self.goto(Grid.LEFT + Cell.WIDTH * i, Grid.TOP - Cell.WIDTH * j)
-
-    def draw_o(self, cell: Cell):
-        radius = cell.marker_rect.width / 2
-        self.penup()
-        self.goto(cell.center_x, cell.marker_rect.bottom)
-        self.pendown()
-        self.speed(0)
-        divisions = 10
-        for _ in range(divisions):
-            self.circle(radius, extent=360/divisions)
-        self.speed(GamePen.DEFAULT_SPEED)
-
-    def draw_x(self, cell: Cell):
-        self.draw_line(cell.marker_rect.left, cell.marker_rect.top, cell.marker_rect.right, cell.marker_rect.bottom)
-        self.draw_line(cell.marker_rect.right, cell.marker_rect.top, cell.marker_rect.left, cell.marker_rect.bottom)
-
-    @wrap(show_turtle)
-    def mark(self, cell: Cell, player: Player):
-        self.pencolor(player.color)
-        if player.marker == MARKER.X:
-            self.draw_x(cell)
-        elif player.marker == MARKER.O:
-            self.draw_o(cell)
-        cell.marker = player.marker
-
-    @wrap(show_turtle)
-    def strikethrough(self, cells, cond, color):
-        self.pencolor(color)
-        self.pensize(5)
-        if cond == "row":
-            left = cells[0].left
-            right = cells[2].right
-            y = cells[0].center_y
-            self.draw_line(left, y, right, y)
-        elif cond == "column":
-            top = cells[0].top
-            bottom = cells[2].bottom
-            x = cells[0].center_x
-            self.draw_line(x, top, x, bottom)
-        elif cond == "ascending diagonal":
-            right = cells[0].right
-            top = cells[0].top
-            left = cells[2].left
-            bottom = cells[2].bottom
-            self.draw_line(right, top, left, bottom)
-        elif cond == "descending diagonal":
-            left = cells[0].left
-            top = cells[0].top
-            right = cells[2].right
-            bottom = cells[2].bottom
-            self.draw_line(left, top, right, bottom)
-        self.pensize(GamePen.DEFAULT_SIZE)
-
-    @wrap(draw_instantly)
-    def draw_menu_screen(self, menu_screen: Menu):
-        self.clear()
-        self.draw_textbox(menu_screen.title)
-        for column in [col for col in vars(menu_screen.settings).values() if isinstance(col, dict)]:
-            for setting in column.values():
-                self.draw_textbox(setting.textbox)
-        self.draw_textbox(menu_screen.start_button)
-
-    @wrap(draw_instantly)
-    def draw_game_over_screen(self, over_screen: GameOver):
-        for textbox in vars(over_screen).values():
-            self.draw_textbox(textbox)
-
-
-class STATE:
-    MENU = 1
-    PLAY = 2
-    GAME_OVER = 3
-
-
-class Game:
-    def __init__(self):
-        self.screen = GameScreen(onclick=self.click_handler)
-        self.pen = GamePen()
-        self.menu = Menu()
-        self.grid = Grid()
-        self.game_over = GameOver()
-        self.player = Player()
-        self.computer = Computer()
-        self.current_player = self.get_fist_player()
-        self.state = STATE.MENU
-        self.draw_menu()
-
-    def run(self):
-        self.screen.mainloop()
-
-    def get_fist_player(self):
-        return self.player if self.player.order == "first" else self.computer
-
-    def reset(self):
-        self.grid = Grid()
-        self.current_player = self.get_fist_player()
-
-    def change_current_player(self):
-        self.current_player = self.player if self.current_player == self.computer else self.computer
-
-    def play_move(self, cell):
-        self.pen.mark(cell, self.current_player)
-        self.grid.print_cells()
-        # check if they won
-        win, cells, cond = self.grid.check_win(self.current_player.marker)
-        if win:
-            self.pen.strikethrough(cells, cond, self.current_player.color)
-            self.end_game("you win!" if self.current_player == self.player else "you lose")
-        elif self.grid.check_tie():
-            self.end_game("tie")
-        else:
-            # continue game
-            self.change_current_player()
-            if self.current_player == self.computer:
-                self.computer_turn()
-
-    def computer_turn(self):
-        cell = self.computer.choose_cell(self.grid)
-        self.play_move(cell)
-
-    def start_game(self):
-        self.pen.clear()
-        self.state = STATE.PLAY
-        self.pen.draw_grid()
-        if self.current_player == self.computer:
-            self.play_move(self.grid.all_cells()[0])
-
-    def draw_menu(self):
-        self.pen.draw_menu_screen(self.menu)
-
-    def end_game(self, condition):
-        self.state = STATE.GAME_OVER
-        self.game_over = GameOver(condition)
-        self.pen.draw_game_over_screen(self.game_over)
-        self.reset()
-
-    def menu_handler(self, x, y):
-        button_name = self.menu.get_clicked_button(x, y)
-        if button_name in self.menu.settings.list:
-            self.menu.switch_setting(button_name)
-            self.pen.draw_menu_screen(self.menu)
-            self.player = Player(marker=self.menu.settings.player.get("marker").value,
-                                 color=self.menu.settings.player.get("color").value,
-                                 order=self.menu.settings.player.get("order").value)
-            self.computer = Computer(marker=self.menu.settings.computer.get("marker").value,
-                                     color=self.menu.settings.computer.get("color").value,
-                                     order=self.menu.settings.computer.get("order").value)
-            self.current_player = self.get_fist_player()
-        elif button_name == "start":
-            self.start_game()
-
-    def game_handler(self, x, y):
-        cell = self.grid.get_clicked_cell(x, y)
-        if cell is not None and cell.is_unmarked():
-            self.play_move(cell)
-
-    def game_over_handler(self, x, y):
-        button_name = self.game_over.get_clicked_button(x, y)
-        if button_name == "play":
-            self.start_game()
-        elif button_name == "menu":
-            self.draw_menu()
-            self.state = STATE.MENU
-
-    def click_handler(self, x, y):
-        if not self.screen.enable_clicks:
-            return
-        self.screen.enable_clicks = False
-        if self.state == STATE.MENU:
-            self.menu_handler(x, y)
-        elif self.state == STATE.PLAY:
-            self.game_handler(x, y)
-        elif self.state == STATE.GAME_OVER:
-            self.game_over_handler(x, y)
-        self.screen.enable_clicks = True
+def __getattr__(name):
+    # The turtle front end, imported only when it is used so the game logic loads without Tk
+    if name in ("Game", "GamePen", "GameScreen"):
+        import gui
+        return getattr(gui, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
-    game = Game()
-    game.run()
+    import gui
+    gui.main()
@@ -0,0 +1,150 @@
+"""Monte Carlo tree search with UCT, on bitboards of any board size.
+
+Each playout finishes the game with random moves. The tree is kept between
+moves, so the search continues from the position the opponent left.
+"""
+import math
+import random
+import time
+
+from bitboard import iterate_bits
+
+
+class Node:
+    __slots__ = ("move", "parent", "children", "untried", "wins", "visits", "terminal")
+
+    def __init__(self, move, parent, untried, terminal):
+        self.move = move
+        self.parent = parent
+        self.children = {}
+        self.untried = untried
+        # Wins of the player who played ``move``, with draws counting half
+        self.wins = 0.0
+        self.visits = 0
+        self.terminal = terminal
+
+
+class MonteCarlo:
+    EXPLORATION = math.sqrt(2)
+    REPORT_INTERVAL = 256
+
+    def __init__(self, geometry, playouts=None, time_budget=1.0, seed=None):
+        """Searches until ``playouts`` playouts are done or ``time_budget`` seconds pass, whichever is first"""
+        self.geometry = geometry
+        self.playouts = playouts
+        self.time_budget = time_budget
+        self.random = random.Random(seed)
+        self.root = None
+        self.position = None
+        self.nodes = 0
+
+    def get_moves(self, own, opp):
+        moves = list(iterate_bits(self.geometry.full & ~(own | opp)))
+        self.random.shuffle(moves)
+        return moves
+
+    def create_node(self, move, parent, own, opp):
+        """Creates the node reached when ``opp`` has just played ``move`` and ``own`` is to move"""
+        terminal = move is not None and self.geometry.has_line(opp, move) or own | opp == self.geometry.full
+        return Node(move, parent, [] if terminal else self.get_moves(own, opp), terminal)
+
+    def get_root(self, own, opp):
+        """Returns the node of the position, reusing the subtree below the last move and the opponent's reply"""
+        if self.position is not None:
+            root_own, root_opp = self.position
+            own_move, opp_move = own ^ root_own, opp ^ root_opp
+            if root_own & ~own == 0 and root_opp & ~opp == 0 and own_move.bit_count() == 1 == opp_move.bit_count():
+                child = self.root.children.get(own_move)
+                node = None if child is None else child.children.get(opp_move)
+                if node is not None:
+                    node.parent = None
+                    return node
+        return self.create_node(None, None, own, opp)
+
+    def choose(self, own, opp, on_best=None, cancel=None):
+        """Returns the best move for ``own`` as a bit. ``on_best`` is called with the best move every so often.
+
+        Setting the ``cancel`` event ends the search early.
+        """
+        deadline = time.perf_counter() + self.time_budget
+        self.root = root = self.get_root(own, opp)
+        self.position = None
+        self.nodes = 0
+        best = None
+        while time.perf_counter() < deadline and (cancel is None or not cancel.is_set()):
+            if self.playouts is not None and self.nodes >= self.playouts:
+                break
+            self.run_playout(root, own, opp)
+            self.nodes += 1
+            if on_best is not None and self.nodes % MonteCarlo.REPORT_INTERVAL == 0:
+                move = self.get_best_move(root)
+                if move != best:
+                    best = move
+                    on_best(best)
+        best = self.get_best_move(root)
+        if best is None:
+            best = root.untried[0]
+        # Keep the tree for the next call, which starts two plies below it
+        self.position = (own, opp)
+        return best
+
+    @staticmethod
+    def get_best_move(node):
+        if not node.children:
+            return None
+        return max(node.children.values(), key=lambda child: child.visits).move
+
+    def select(self, node):
+        log_visits = math.log(node.visits)
+        exploration = MonteCarlo.EXPLORATION
+        best_child = None
+        best_value = -1.0
+        for child in node.children.values():
+            value = child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+            if value > best_value:
+                best_child, best_value = child, value
+        return best_child
+
+    def run_playout(self, root, own, opp):
+        node = root
+        # Players are swapped at every ply; ``own`` is always the player to move at ``node``
+        while not node.untried and not node.terminal:
+            node = self.select(node)
+            own, opp = opp, own | node.move
+        if node.untried:
+            move = node.untried.pop()
+            own, opp = opp, own | move
+            child = self.create_node(move, node, own, opp)
+            node.children[move] = child
+            node = child
+        winner = self.play_randomly(node, own, opp)
+        # 1 if the player who moved into ``node`` won, 0 if they lost and a half for a draw
+        result = 0.5 if winner is None else 1.0 if winner else 0.0
+        while node is not None:
+            node.visits += 1
+            node.wins += result
+            result = 1.0 - result
+            node = node.parent
+
+    def play_randomly(self, node, own, opp):
+        """Finishes the game with random moves from ``node``.
+
+        Returns True if the player who moved into ``node`` wins, False if they lose and None for a draw.
+        """
+        geometry = self.geometry
+        if node.terminal:
+            return None if node.move is None or not geometry.has_line(opp, node.move) else True
+        empty = list(iterate_bits(geometry.full & ~(own | opp)))
+        randrange = self.random.randrange
+        opponent_to_move = True
+        while empty:
+            index = randrange(len(empty))
+            move = empty[index]
+            empty[index] = empty[-1]
+            empty.pop()
+            own |= move
+            if geometry.has_line(own, move):
+                return not opponent_to_move
+            own, opp = opp, own
+            opponent_to_move = not opponent_to_move
+        return None
@@ -0,0 +1,180 @@
+"""Game records: one JSON line per game, appended in batches, and streaming analysis of them.
+
+A record holds the board size, the player's and computer's settings, the moves
+as row-major cell indices, the think time of every move in seconds and the
+result: "player", "computer", "tie", or null for a game left unfinished.
+
+``python records.py games.jsonl`` prints statistics over a whole log.
+"""
+import argparse
+import json
+from collections import Counter
+
+from main import Grid
+
+RESULTS = ("player", "computer", "tie", None)
+
+
+def get_settings(player):
+    return {
+        "marker": player.marker,
+        "color": player.color,
+        "order": player.order,
+        "agent": player.agent,
+        "level": getattr(player, "level", None),
+    }
+
+
+class GameLog:
+    """Records the games played and appends them to a file in batches of ``batch_size``"""
+    BATCH_SIZE = 100
+
+    def __init__(self, path, batch_size=BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch = []
+        self.record = None
+
+    def start(self, grid: Grid, player, computer):
+        self.record = {
+            "rows": grid.rows,
+            "columns": grid.columns,
+            "win_length": grid.win_length,
+            "player": get_settings(player),
+            "computer": get_settings(computer),
+            "moves": [],
+            "times": [],
+            "result": None,
+        }
+
+    def add_move(self, cell, think_time):
+        if self.record is not None:
+            self.record["moves"].append(cell.row * self.record["columns"] + cell.col)
+            self.record["times"].append(round(think_time, 4))
+
+    def finish(self, result):
+        if self.record is None:
+            return
+        self.record["result"] = result
+        self.batch.append(json.dumps(self.record, separators=(",", ":")))
+        self.record = None
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            with open(self.path, "a") as file:
+                file.write("\n".join(self.batch) + "\n")
+            self.batch.clear()
+
+    def close(self):
+        """Writes out the games recorded so far, counting a game in progress as unfinished"""
+        self.finish(None)
+        self.flush()
+
+
+def read_records(path):
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def replay(record, grids=None):
+    """Plays the record's moves through a Grid, yielding (grid, mover, cell, think_time) before every move.
+
+    ``grids`` maps board sizes to grids to reuse, so replaying many records does not build a grid for each.
+    """
+    size = (record["rows"], record["columns"], record["win_length"])
+    grid = grids.get(size) if grids is not None else None
+    if grid is None:
+        grid = Grid(*size)
+        if grids is not None:
+            grids[size] = grid
+    grid.clear()
+    first, second = ("player", "computer") if record["player"]["order"] == "first" else ("computer", "player")
+    movers = (first, second)
+    for turn, (move, think_time) in enumerate(zip(record["moves"], record["times"])):
+        mover = movers[turn % 2]
+        cell = grid.cells[move // grid.columns][move % grid.columns]
+        yield grid, mover, cell, think_time
+        cell.marker = record[mover]["marker"]
+
+
+class LatencyHistogram:
+    """Counts think times in whole milliseconds, so memory does not grow with the number of moves"""
+    def __init__(self):
+        self.counts = Counter()
+        self.total = 0
+
+    def add(self, seconds):
+        self.counts[int(seconds * 1000)] += 1
+        self.total += 1
+
+    def get_percentile(self, percent):
+        """Returns the think time in milliseconds below which ``percent`` of the moves fall"""
+        if not self.total:
+            return None
+        rank = min(self.total - 1, int(self.total * percent / 100))
+        seen = 0
+        for milliseconds in sorted(self.counts):
+            seen += self.counts[milliseconds]
+            if seen > rank:
+                return milliseconds
+
+
+class Statistics:
+    OPENING_MOVES = 2
+
+    def __init__(self):
+        self.games = 0
+        self.results = Counter()
+        self.openings = Counter()
+        self.loss_positions = Counter()
+        self.think_times = {"player": LatencyHistogram(), "computer": LatencyHistogram()}
+
+    def add(self, record, grids=None):
+        self.games += 1
+        self.results[record["result"]] += 1
+        self.openings[tuple(record["moves"][:Statistics.OPENING_MOVES])] += 1
+        last_computer_position = None
+        for grid, mover, _, think_time in replay(record, grids):
+            self.think_times[mover].add(think_time)
+            if mover == "computer":
+                last_computer_position = grid.to_string()
+        # The last position the computer moved from in a game it lost
+        if record["result"] == "player" and last_computer_position is not None:
+            self.loss_positions[last_computer_position] += 1
+
+
+def analyze(records):
+    """Returns the Statistics of an iterable of records, holding only one record at a time"""
+    statistics = Statistics()
+    grids = {}
+    for record in records:
+        statistics.add(record, grids)
+    return statistics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Statistics of a game record log")
+    parser.add_argument("path")
+    parser.add_argument("--top", type=int, default=5, help="openings and loss positions to list")
+    args = parser.parse_args()
+
+    statistics = analyze(read_records(args.path))
+    print(f"{statistics.games} games")
+    print("results " + "  ".join(f"{result} {statistics.results[result]}" for result in RESULTS))
+    print("openings")
+    for moves, count in statistics.openings.most_common(args.top):
+        print(f"  {' '.join(map(str, moves)):<10} {count}")
+    print("computer loss positions")
+    for board, count in statistics.loss_positions.most_common(args.top):
+        print(f"  {board:<10} {count}")
+    for mover, histogram in statistics.think_times.items():
+        percentiles = "  ".join(f"p{percent} {histogram.get_percentile(percent)}ms" for percent in (50, 95, 99))
+        print(f"{mover} think time {percentiles}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Alpha-beta search used by the computer on boards other than the classic 3x3.
+
+The search deepens one ply at a time until the time budget runs out and plays
+the best move of the last completed depth.
+"""
+import random
+import time
+from concurrent.futures import FIRST_EXCEPTION, wait
+
+from bitboard import cell_index, get_geometry, iterate_bits
+
+WIN = 10 ** 9
+STOP_POLL_INTERVAL = 0.05
+
+_engines = {}
+# The root position each worker's engine last searched, by board size
+_roots = {}
+
+
+class TimeUp(Exception):
+    pass
+
+
+def choose_near_best(scores, tolerance, rng):
+    """Picks one of the moves whose score is within ``tolerance`` of the best, as a fraction of the score range.
+
+    ``scores`` maps moves to scores. With no tolerance, the first of the best moves is picked.
+    """
+    best = max(scores, key=scores.get)
+    if not tolerance:
+        return best
+    high = scores[best]
+    low = min(scores.values())
+    return rng.choice([move for move, score in scores.items() if score >= high - tolerance * (high - low)])
+
+
+class AlphaBeta:
+    SMALL_BOARD = 16
+
+    def __init__(self, geometry, time_budget=1.0, max_depth=None, max_nodes=None, tolerance=0, seed=None):
+        """``max_nodes`` ends the search after that many positions, keeping the last completed depth.
+
+        With a ``tolerance``, every root move is scored exactly and one of the near-best moves is picked at random.
+        """
+        self.geometry = geometry
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.tolerance = tolerance
+        self.random = random.Random(seed)
+        self.root_scores = {}
+        # Value of n markers in a line the other player has not blocked
+        self.weights = [0] + [4 ** n for n in range(1, geometry.win_length)] + [WIN]
+        self.best_moves = {}
+        self.deadline = None
+        self.nodes = 0
+        self.depth = 0
+        self.cancel = None
+
+    def is_cancelled(self):
+        return self.cancel is not None and self.cancel.is_set()
+
+    def choose(self, own, opp, on_best=None, cancel=None):
+        """Returns the best move for ``own`` as a bit.
+
+        ``on_best`` is called with the best move of every completed depth. Setting the ``cancel``
+        event ends the search at the next node, as if the time budget had run out.
+        """
+        self.deadline = time.perf_counter() + self.time_budget
+        self.cancel = cancel
+        self.best_moves.clear()
+        self.nodes = 0
+        self.depth = 0
+        empty_cells = (self.geometry.full & ~(own | opp)).bit_count()
+        max_depth = empty_cells if self.max_depth is None else min(self.max_depth, empty_cells)
+        best = self.order_moves(own, opp)[0]
+        self.root_scores = {}
+        for depth in range(1, max_depth + 1):
+            try:
+                score, best = self.search_root(own, opp, depth)
+            except TimeUp:
+                break
+            self.depth = depth
+            if on_best is not None:
+                on_best(best)
+            # Stop once the result is decided or the node budget is spent
+            if abs(score) > WIN - max_depth or self.max_nodes is not None and self.nodes >= self.max_nodes:
+                break
+        if self.tolerance and self.root_scores:
+            best = choose_near_best(self.root_scores, self.tolerance, self.random)
+        return best
+
+    def search_root(self, own, opp, depth):
+        alpha = -WIN - 1
+        best = None
+        scores = {}
+        for move in self.order_moves(own, opp):
+            # A full window for every move when picking among near-best moves, so their scores are exact
+            bound = -WIN - 1 if self.tolerance else alpha
+            score = scores[move] = -self.negamax(opp, own | move, move, depth - 1, -WIN - 1, -bound, 1)
+            if best is None or score > alpha:
+                alpha, best = score, move
+        self.best_moves[own, opp] = best
+        self.root_scores = scores
+        return alpha, best
+
+    def negamax(self, own, opp, last, depth, alpha, beta, ply):
+        """Scores the position for ``own``, who is to move after ``opp`` played ``last``"""
+        self.nodes += 1
+        if time.perf_counter() > self.deadline or self.is_cancelled():
+            raise TimeUp
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise TimeUp
+        if self.geometry.has_line(opp, last):
+            return ply - WIN
+        if own | opp == self.geometry.full:
+            return 0
+        if depth == 0:
+            return self.evaluate(own, opp)
+        best = -WIN - 1
+        best_move = None
+        for move in self.order_moves(own, opp):
+            score = -self.negamax(opp, own | move, move, depth - 1, -beta, -alpha, ply + 1)
+            if score > best:
+                best, best_move = score, move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+        self.best_moves[own, opp] = best_move
+        return best
+
+    def evaluate(self, own, opp):
+        score = 0
+        weights = self.weights
+        for mask in self.geometry.lines:
+            if not opp & mask:
+                score += weights[(own & mask).bit_count()]
+            elif not own & mask:
+                score -= weights[(opp & mask).bit_count()]
+        return score
+
+    def get_moves(self, own, opp):
+        geometry = self.geometry
+        marked = own | opp
+        empty = geometry.full & ~marked
+        if geometry.size <= AlphaBeta.SMALL_BOARD or not marked:
+            return empty if marked else 1 << (geometry.rows // 2 * geometry.columns + geometry.columns // 2)
+        # Only consider cells close to the markers already on a large board
+        nearby = 0
+        for bit in iterate_bits(marked):
+            nearby |= geometry.neighbours[cell_index(bit)]
+        return empty & nearby
+
+    def order_moves(self, own, opp):
+        """Returns the candidate moves, best first: the best move from a shallower search, then wins and blocks"""
+        weights = self.weights
+        cell_lines = self.geometry.cell_lines
+        previous_best = self.best_moves.get((own, opp))
+        ordered = []
+        for move in iterate_bits(self.get_moves(own, opp)):
+            if move == previous_best:
+                value = WIN * 4
+            else:
+                value = 0
+                for mask in cell_lines[cell_index(move)]:
+                    if not opp & mask:
+                        value += weights[(own & mask).bit_count() + 1]
+                    elif not own & mask:
+                        value += weights[(opp & mask).bit_count() + 1]
+            ordered.append((-value, move))
+        ordered.sort()
+        return [move for _, move in ordered]
+
+
+def search_move(board_size, own, opp, move, depth, deadline, low=-WIN - 1, high=WIN + 1):
+    """Runs in a worker process: returns the score of ``move`` for ``own`` and the nodes searched.
+
+    The score is exact when it falls between ``low`` and ``high``, and a bound beyond the one
+    it passes otherwise. It is None when the wall-clock ``deadline`` passes first.
+    """
+    engine = _engines.get(board_size)
+    if engine is None:
+        engine = _engines[board_size] = AlphaBeta(get_geometry(*board_size))
+    # Best moves found at earlier depths of the same root order the moves, but older ones only take memory
+    if _roots.get(board_size) != (own, opp):
+        _roots[board_size] = (own, opp)
+        engine.best_moves.clear()
+    engine.nodes = 0
+    engine.deadline = time.perf_counter() + deadline - time.time()
+    try:
+        score = -engine.negamax(opp, own | move, move, depth - 1, -high, -low, 1)
+    except TimeUp:
+        score = None
+    return score, engine.nodes
+
+
+class ParallelAlphaBeta(AlphaBeta):
+    """Searches the root moves at the same time over an executor of worker processes.
+
+    The first move in order is searched here, and the workers then test whether each other
+    move beats it with a null window. Only the moves that do are searched again, together,
+    for their exact scores, so the chosen move is the one the serial search picks at the same
+    depth, whatever the number of workers. With a ``tolerance`` every move is scored exactly.
+    """
+    def __init__(self, geometry, executor, time_budget=1.0, max_depth=None, max_nodes=None, tolerance=0,
+                 seed=None):
+        super().__init__(geometry, time_budget, max_depth, max_nodes, tolerance, seed)
+        self.executor = executor
+
+    def search_root(self, own, opp, depth):
+        moves = self.order_moves(own, opp)
+        if self.tolerance:
+            scores = dict(zip(moves, self.search_moves(own, opp, moves, depth)))
+        else:
+            first = moves[0]
+            bound = -self.negamax(opp, own | first, first, depth - 1, -WIN - 1, WIN + 1, 1)
+            scores = dict(zip(moves[1:], self.search_moves(own, opp, moves[1:], depth, bound, bound + 1)))
+            better = [move for move in moves[1:] if scores[move] > bound]
+            scores.update(zip(better, self.search_moves(own, opp, better, depth, bound)))
+            scores[first] = bound
+        # The first of the best moves in search order, as in the serial search
+        alpha, best = max(((scores[move], move) for move in moves), key=lambda result: result[0])
+        self.best_moves[own, opp] = best
+        self.root_scores = scores
+        return alpha, best
+
+    def search_moves(self, own, opp, moves, depth, low=-WIN - 1, high=WIN + 1):
+        """Returns the scores of the moves from the workers, searched with the window from ``low`` to ``high``"""
+        geometry = self.geometry
+        board_size = (geometry.rows, geometry.columns, geometry.win_length)
+        deadline = time.time() + self.deadline - time.perf_counter()
+        futures = [
+            self.executor.submit(search_move, board_size, own, opp, move, depth, deadline, low, high)
+            for move in moves
+        ]
+        try:
+            pending = futures
+            while pending:
+                if self.is_cancelled():
+                    raise TimeUp
+                _, pending = wait(pending, STOP_POLL_INTERVAL, FIRST_EXCEPTION)
+            results = [future.result() for future in futures]
+        finally:
+            for future in futures:
+                future.cancel()
+        self.nodes += sum(nodes for _, nodes in results)
+        if any(score is None for score, _ in results):
+            raise TimeUp
+        return [score for score, _ in results]
@@ -0,0 +1,218 @@
+"""Opt-in export of the search tree the computer explores on the classic board, and a summary of it.
+
+Pass ``Computer(instrumentation=SearchTree("tree.jsonl"))`` (or ``python main.py
+--search-tree tree.jsonl``) to write one JSON line per position scored. Lines are
+written as each position's subtree finishes, so children come before their
+parent and only the current path is held in memory. Once ``max_bytes`` have
+been written, positions are still counted but no longer written.
+
+``python searchtree.py tree.jsonl`` lists the largest subtrees and the positions
+searched more than once.
+"""
+import argparse
+import heapq
+import json
+import sys
+import time
+from collections import Counter
+
+import bitboard
+from instrument import JsonSink
+from records import read_records
+
+
+def get_reason(computer, own, opp, turn):
+    """Names the rule Computer.search used to score the position, and so how much of it was pruned"""
+    if bitboard.is_full(own, opp):
+        return "tie"
+    if bitboard.has_won(own):
+        return "won"
+    if bitboard.get_winning_cells(opp, own):
+        return "losing"
+    if computer.search_depth is not None and turn > computer.search_depth:
+        return "depth"
+    winning_cells = bitboard.get_winning_cells(own, opp)
+    if len(winning_cells) > 1:
+        return "trap"
+    if winning_cells:
+        return "block"
+    return "expanded"
+
+
+class Frame:
+    __slots__ = ("id", "parent", "searched", "children", "size", "start")
+
+    def __init__(self, node_id, parent):
+        self.id = node_id
+        self.parent = parent
+        self.searched = False
+        self.children = 0
+        self.size = 1
+        self.start = time.perf_counter()
+
+
+class MoveTree:
+    """Records the positions scored while the computer chooses one move"""
+    def __init__(self, export, computer):
+        self.export = export
+        self.computer = computer
+        self.move = export.moves
+        self.source = None
+        self.stack = []
+        self.nodes = 0
+        self.written = 0
+
+    def wrap_evaluate(self, evaluate):
+        def wrapper(own, opp, turn):
+            parent = self.stack[-1] if self.stack else None
+            frame = Frame(self.export.get_id(), None if parent is None else parent.id)
+            self.stack.append(frame)
+            try:
+                score, symmetric = evaluate(own, opp, turn)
+            finally:
+                self.stack.pop()
+            self.nodes += 1
+            if parent is not None:
+                parent.children += 1
+                parent.size += frame.size
+            record = {
+                "move": self.move,
+                "id": frame.id,
+                "parent": frame.parent,
+                "own": own,
+                "opp": opp,
+                "turn": turn,
+                "score": score,
+                "cached": not frame.searched,
+                "reason": get_reason(self.computer, own, opp, turn) if frame.searched else None,
+                "children": frame.children,
+                "size": frame.size,
+                "time": round(time.perf_counter() - frame.start, 6),
+            }
+            if self.export.write(record):
+                self.written += 1
+            return score, symmetric
+        return wrapper
+
+    def wrap_search(self, search):
+        def wrapper(own, opp, turn):
+            self.stack[-1].searched = True
+            return search(own, opp, turn)
+        return wrapper
+
+
+class SearchTree(JsonSink):
+    MAX_BYTES = 100 * 2 ** 20
+
+    def __init__(self, sink=sys.stderr, max_bytes=MAX_BYTES):
+        super().__init__(sink)
+        self.max_bytes = max_bytes
+        self.written = 0
+        self.next_id = 0
+        self.moves = 0
+
+    def get_id(self):
+        self.next_id += 1
+        return self.next_id
+
+    def start(self, computer):
+        tree = MoveTree(self, computer)
+        computer.evaluate = tree.wrap_evaluate(computer.evaluate)
+        computer.search = tree.wrap_search(computer.search)
+        return tree
+
+    @staticmethod
+    def stop(computer):
+        del computer.evaluate, computer.search
+
+    def record(self, computer, tree: MoveTree, grid, cell):
+        self.moves += 1
+        # Always written, so a truncated file still shows where each move ended
+        self.write({
+            "move": tree.move,
+            "marker": computer.marker,
+            "board": grid.to_string(),
+            "cell": [cell.row, cell.col],
+            "source": tree.source,
+            "nodes": tree.nodes,
+            "written": tree.written,
+            "truncated": tree.written < tree.nodes,
+        }, force=True)
+        self.sink.flush()
+
+    def write(self, record, force=False):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        if not force and self.written + len(line) > self.max_bytes:
+            return False
+        self.sink.write(line)
+        self.written += len(line)
+        return True
+
+
+class Summary:
+    def __init__(self, top=10):
+        self.top = top
+        self.moves = 0
+        self.nodes = 0
+        self.cached = 0
+        self.truncated = 0
+        self.reasons = Counter()
+        self.turns = Counter()
+        self.positions = Counter()
+        self.largest = []
+
+    def add(self, record):
+        if "id" not in record:
+            self.moves += 1
+            self.truncated += record["truncated"]
+            return
+        self.nodes += 1
+        self.turns[record["turn"]] += 1
+        if record["cached"]:
+            self.cached += 1
+            return
+        self.positions[record["own"], record["opp"], record["turn"]] += 1
+        self.reasons[record["reason"]] += 1
+        # The largest subtrees so far, in a heap of at most ``top`` entries
+        entry = (record["size"], record["time"], record["move"], record["own"], record["opp"], record["turn"])
+        if len(self.largest) < self.top:
+            heapq.heappush(self.largest, entry)
+        else:
+            heapq.heappushpop(self.largest, entry)
+
+    def get_repeated(self):
+        return [(key, count) for key, count in self.positions.most_common(self.top) if count > 1]
+
+
+def to_board(own, opp):
+    """Shows a position with x for the computer's markers and o for the opponent's"""
+    return "".join(
+        "x" if own >> index & 1 else "o" if opp >> index & 1 else "."
+        for index in range(bitboard.SIZE * bitboard.SIZE)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summary of an exported search tree")
+    parser.add_argument("path")
+    parser.add_argument("--top", type=int, default=10, help="subtrees and positions to list")
+    args = parser.parse_args()
+
+    summary = Summary(args.top)
+    for record in read_records(args.path):
+        summary.add(record)
+    print(f"{summary.moves} moves, {summary.nodes} positions written, {summary.truncated} moves truncated")
+    if summary.nodes:
+        print(f"cache hits {summary.cached} ({summary.cached / summary.nodes:.1%})")
+    print("searched by rule " + "  ".join(f"{reason} {count}" for reason, count in summary.reasons.most_common()))
+    print("positions by turn " + "  ".join(f"{turn}: {count}" for turn, count in sorted(summary.turns.items())))
+    print("largest subtrees (x is the computer)")
+    for size, seconds, move, own, opp, turn in sorted(summary.largest, reverse=True):
+        print(f"  {to_board(own, opp)}  turn {turn}  move {move}  {size} positions  {seconds * 1000:.2f}ms")
+    print("positions searched again instead of found in the cache")
+    for (own, opp, turn), count in summary.get_repeated():
+        print(f"  {to_board(own, opp)}  turn {turn}  {count} times")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""Headless game server: many independent games over a local socket.
+
+Every request and response is one line of JSON. Example session::
+
+    {"op": "new", "marker": "o", "order": "second"}
+    {"ok": true, "session": 1, "board": "....x....", "computer_move": [1, 1], "winner": null}
+    {"op": "move", "session": 1, "row": 0, "col": 0}
+    {"ok": true, "session": 1, "board": "ox..x....", "computer_move": [0, 1], "winner": null}
+
+``new`` also accepts ``rows``, ``columns`` (up to 20), ``win_length`` and the computer's
+``level`` (see Computer.LEVELS). ``winner`` becomes "player", "computer" or
+"tie" when the game ends. Requests may carry an ``id``, which is copied to the
+response, so one connection can play several sessions at once. A session can
+only be played and closed on the connection that opened it.
+The computer's moves are searched in a process pool, off the event loop.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from main import MARKER, Computer, Grid, Player
+
+logger = logging.getLogger(__name__)
+
+MAX_BOARD_SIZE = 20
+
+_computers = {}
+
+
+def choose_move(marker, level, rows, columns, win_length, board, time_budget):
+    """Runs in a worker process and returns the computer's move as (row, col)"""
+    key = (marker, level, time_budget)
+    computer = _computers.get(key)
+    if computer is None:
+        # One computer per marker and level, so its transposition table carries over between sessions
+        computer = _computers[key] = Computer.at_level(level, marker, time_budget=time_budget)
+    grid = Grid(rows, columns, win_length)
+    for cell, cell_marker in zip(grid.all_cells(), board):
+        if cell_marker != ".":
+            cell.marker = cell_marker
+    cell = computer.choose_cell(grid)
+    return cell.row, cell.col
+
+
+class RequestError(Exception):
+    pass
+
+
+def get_int(request, key, default=None):
+    value = request.get(key, default)
+    # bool is a subclass of int, but true is not a number of rows
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise RequestError(f"{key} must be an integer")
+    return value
+
+
+class Session:
+    def __init__(self, session_id, marker=MARKER.O, order="second", rows=3, columns=3, win_length=3, level="hard"):
+        if marker not in (MARKER.X, MARKER.O):
+            raise RequestError(f"marker must be {MARKER.X!r} or {MARKER.O!r}")
+        if order not in ("first", "second"):
+            raise RequestError("order must be 'first' or 'second'")
+        if not isinstance(level, str) or level not in Computer.LEVELS:
+            raise RequestError(f"level must be one of {', '.join(Computer.LEVELS)}")
+        if not 1 <= rows <= MAX_BOARD_SIZE or not 1 <= columns <= MAX_BOARD_SIZE:
+            raise RequestError(f"rows and columns must be between 1 and {MAX_BOARD_SIZE}")
+        if not 1 <= win_length <= max(rows, columns):
+            raise RequestError("invalid board size")
+        self.id = session_id
+        self.grid = Grid(rows, columns, win_length)
+        self.player = Player(marker, order=order)
+        self.computer_marker = self.player.opponent_marker
+        self.level = level
+        self.winner = None
+        self.lock = asyncio.Lock()
+
+    def play(self, cell, marker):
+        cell.marker = marker
+        if self.grid.check_win(marker)[0]:
+            self.winner = "player" if marker == self.player.marker else "computer"
+        elif self.grid.check_tie():
+            self.winner = "tie"
+
+    def get_state(self, computer_move=None):
+        return {
+            "ok": True,
+            "session": self.id,
+            "board": self.grid.to_string(),
+            "computer_move": computer_move,
+            "winner": self.winner,
+        }
+
+
+class GameServer:
+    def __init__(self, executor, time_budget=1.0):
+        self.executor = executor
+        self.time_budget = time_budget
+        self.sessions = {}
+        self.session_ids = itertools.count(1)
+
+    async def computer_turn(self, session: Session):
+        grid = session.grid
+        loop = asyncio.get_running_loop()
+        row, col = await loop.run_in_executor(
+            self.executor, choose_move, session.computer_marker, session.level,
+            grid.rows, grid.columns, grid.win_length, grid.to_string(), self.time_budget
+        )
+        session.play(grid.cells[row][col], session.computer_marker)
+        return [row, col]
+
+    def get_session(self, request, owned):
+        """Returns the session of the request, which must have been opened on the same connection"""
+        session_id = request.get("session")
+        # true is an int as well, and would name session 1
+        if not isinstance(session_id, int) or isinstance(session_id, bool) or session_id not in owned:
+            raise RequestError("unknown session")
+        return self.sessions[session_id]
+
+    async def new_session(self, request, owned):
+        session = Session(
+            next(self.session_ids),
+            request.get("marker", MARKER.O),
+            request.get("order", "second"),
+            get_int(request, "rows", 3),
+            get_int(request, "columns", 3),
+            get_int(request, "win_length", 3),
+            request.get("level", "hard"),
+        )
+        self.sessions[session.id] = session
+        owned.add(session.id)
+        async with session.lock:
+            computer_move = None
+            if session.player.order == "second":
+                computer_move = await self.computer_turn(session)
+            return session.get_state(computer_move)
+
+    async def move(self, request, owned):
+        session = self.get_session(request, owned)
+        async with session.lock:
+            if session.winner is not None:
+                raise RequestError("the game is over")
+            grid = session.grid
+            row, col = get_int(request, "row"), get_int(request, "col")
+            if not (0 <= row < grid.rows and 0 <= col < grid.columns):
+                raise RequestError("row and col must name a cell on the board")
+            cell = grid.cells[row][col]
+            if not cell.is_unmarked():
+                raise RequestError("the cell is already marked")
+            session.play(cell, session.player.marker)
+            computer_move = None
+            if session.winner is None:
+                computer_move = await self.computer_turn(session)
+            return session.get_state(computer_move)
+
+    def close_session(self, request, owned):
+        session = self.get_session(request, owned)
+        del self.sessions[session.id]
+        owned.discard(session.id)
+        return {"ok": True, "session": session.id}
+
+    async def handle_request(self, line, owned):
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as error:
+            return {"ok": False, "error": f"invalid JSON: {error}"}
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "a request must be a JSON object"}
+        try:
+            op = request.get("op")
+            if op == "new":
+                response = await self.new_session(request, owned)
+            elif op == "move":
+                response = await self.move(request, owned)
+            elif op == "close":
+                response = self.close_session(request, owned)
+            else:
+                raise RequestError(f"unknown op {op!r}")
+        except RequestError as error:
+            response = {"ok": False, "error": str(error)}
+        except Exception:
+            # Still answer, so the client is not left waiting for a response that never comes
+            logger.exception("request %r failed", request)
+            response = {"ok": False, "error": "internal error"}
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    async def respond(self, line, owned, writer):
+        response = await self.handle_request(line, owned)
+        writer.write(json.dumps(response).encode() + b"\n")
+
+    async def handle_connection(self, reader, writer):
+        owned = set()
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(self.respond(line, owned, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                await writer.drain()
+            if tasks:
+                await asyncio.wait(tasks)
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Sessions end with the connection that opened them
+            for session_id in owned:
+                self.sessions.pop(session_id, None)
+            writer.close()
+
+
+async def serve(host="127.0.0.1", port=8765, unix=None, workers=None, time_budget=1.0):
+    with ProcessPoolExecutor(workers) as executor:
+        game_server = GameServer(executor, time_budget)
+        if unix:
+            server = await asyncio.start_unix_server(game_server.handle_connection, unix)
+        else:
+            server = await asyncio.start_server(game_server.handle_connection, host, port)
+        logger.info("serving on %s", unix or f"{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="search processes (default: all cores)")
+    parser.add_argument("--time-budget", type=float, default=1.0, help="seconds per move on boards other than 3x3")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers, args.time_budget))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Headless self-play between computer agents, sharded across processes.
+
+Example: ``python simulate.py computer random --games 100000``
+"""
+import argparse
+import time
+from multiprocessing import Pool, cpu_count
+
+from main import MARKER, Computer, Grid, MonteCarloPlayer, RandomPlayer
+
+AGENTS = {
+    "computer": lambda marker, color, order, seed: Computer(marker, color, order),
+    "search": lambda marker, color, order, seed: Computer(marker, color, order, use_tablebase=False),
+    "easy": lambda marker, color, order, seed: Computer.at_level("easy", marker, color, order, seed=seed),
+    "medium": lambda marker, color, order, seed: Computer.at_level("medium", marker, color, order, seed=seed),
+    "random": lambda marker, color, order, seed: RandomPlayer(marker, color, order, seed=seed),
+    "mcts": lambda marker, color, order, seed: MonteCarloPlayer(marker, color, order, playouts=2000, seed=seed),
+}
+
+
+def create_agent(name, marker, order, seed=None):
+    color = MARKER.RED if marker == MARKER.X else MARKER.BLUE
+    return AGENTS[name](marker, color, order, seed)
+
+
+def play_game(first, second, grid=None):
+    """Plays one game and returns the winning player, or None for a tie"""
+    grid = Grid() if grid is None else grid
+    current, waiting = first, second
+    while True:
+        cell = current.choose_cell(grid)
+        cell.marker = current.marker
+        win, _, _ = grid.check_win(current.marker)
+        if win:
+            return current
+        if grid.check_tie():
+            return None
+        current, waiting = waiting, current
+
+
+def play_shard(shard):
+    """Plays a run of games and returns the wins, draws and losses of agent A"""
+    name_a, name_b, start, games, alternate, seed = shard
+    results = [0, 0, 0]
+    seed_a, seed_b = (None, None) if seed is None else (f"{seed}:{start}:a", f"{seed}:{start}:b")
+    # Agent A always plays x and agent B o; the first mover switches every game when alternating
+    a_first = (create_agent(name_a, MARKER.X, "first", seed_a), create_agent(name_b, MARKER.O, "second", seed_b))
+    b_first = (create_agent(name_b, MARKER.O, "first", seed_b), create_agent(name_a, MARKER.X, "second", seed_a))
+    for game in range(start, start + games):
+        first, second = b_first if alternate and game % 2 else a_first
+        winner = play_game(first, second)
+        if winner is None:
+            results[1] += 1
+        elif winner.marker == MARKER.X:
+            results[0] += 1
+        else:
+            results[2] += 1
+    return results
+
+
+def get_shards(name_a, name_b, games, shards, alternate, seed):
+    size = -(-games // shards)
+    return [
+        (name_a, name_b, start, min(size, games - start), alternate, seed)
+        for start in range(0, games, size)
+    ]
+
+
+def run_match(name_a, name_b, games, workers=None, alternate=True, seed=None):
+    """Plays ``games`` games between two agents and returns the wins, draws and losses of agent A"""
+    workers = workers or cpu_count()
+    shards = get_shards(name_a, name_b, games, workers * 4, alternate, seed)
+    if workers == 1:
+        shard_results = map(play_shard, shards)
+    else:
+        with Pool(workers) as pool:
+            shard_results = pool.map(play_shard, shards)
+    return [sum(counts) for counts in zip(*shard_results)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("agent_a", choices=AGENTS)
+    parser.add_argument("agent_b", choices=AGENTS)
+    parser.add_argument("-n", "--games", type=int, default=10000)
+    parser.add_argument("-w", "--workers", type=int, default=None, help="processes to use (default: all cores)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the random agents")
+    parser.add_argument("--no-alternate", dest="alternate", action="store_false",
+                        help="let agent A move first in every game")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    wins, draws, losses = run_match(args.agent_a, args.agent_b, args.games, args.workers, args.alternate, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"{args.agent_a} vs {args.agent_b}: {args.games} games in {elapsed:.2f}s ({args.games / elapsed:.0f} games/s)")
+    print(f"win {wins / args.games:.3f}  draw {draws / args.games:.3f}  loss {losses / args.games:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Perfect-play tablebase for every legal position of the 3x3 board.
+
+Run ``python tablebase.py`` to write ``tablebase.bin``. The file holds a short
+header followed by one byte per base-3 position rank, so a position is looked up
+with a single index into the memory-mapped file.
+"""
+import mmap
+import os
+
+import bitboard
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebase.bin")
+MAGIC = b"TTT1"
+NO_MOVE = 15
+
+
+class VALUE:
+    """Game-theoretic value for the player to move"""
+    ILLEGAL = 0
+    LOSS = 1
+    DRAW = 2
+    WIN = 3
+
+
+# Base-3 rank of each set of markers, with the player to move counting 1 and the opponent 2
+RANK = tuple(
+    sum(3 ** i for i in range(bitboard.SIZE * bitboard.SIZE) if bits >> i & 1)
+    for bits in range(bitboard.FULL + 1)
+)
+POSITIONS = 3 ** (bitboard.SIZE * bitboard.SIZE)
+
+
+def get_rank(own, opp):
+    return RANK[own] + 2 * RANK[opp]
+
+
+class Tablebase:
+    def __init__(self, data):
+        self.data = data
+
+    @classmethod
+    def load(cls, path=PATH):
+        """Memory-maps the tablebase file, or returns None if it is missing or stale"""
+        try:
+            with open(path, "rb") as file:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        if data[:len(MAGIC)] != MAGIC or len(data) != len(MAGIC) + POSITIONS:
+            data.close()
+            return None
+        return cls(data)
+
+    def probe(self, own, opp):
+        """Returns the value of the position for ``own``, who is to move, and the best move as a bit.
+
+        The move is None for finished positions and for positions the solver never reached.
+        """
+        entry = self.data[len(MAGIC) + get_rank(own, opp)]
+        move = entry & 0xF
+        value = entry >> 4
+        return value, None if move == NO_MOVE or value == VALUE.ILLEGAL else 1 << move
+
+    def close(self):
+        self.data.close()
+
+
+_default = None
+_default_loaded = False
+
+
+def get_default():
+    """Loads the tablebase next to this module once per process"""
+    global _default, _default_loaded
+    if not _default_loaded:
+        _default = Tablebase.load()
+        _default_loaded = True
+    return _default
+
+
+def solve():
+    """Returns ``{rank: (value, move)}`` for every position reachable from the empty board.
+
+    Moves are perfect play, preferring the quickest win and the slowest loss.
+    Between equally good moves, the one the Computer heuristic scores highest wins.
+    """
+    from main import Computer
+
+    heuristic = Computer(use_tablebase=False)
+    solved = {}
+
+    def negamax(own, opp):
+        # own is the player to move, so a completed line can only be the opponent's
+        rank = get_rank(own, opp)
+        if rank in solved:
+            return solved[rank]
+        if bitboard.has_won(opp):
+            result = (-1, 0), None
+        elif bitboard.is_full(own, opp):
+            result = (0, 0), None
+        else:
+            options = []
+            for cell in bitboard.get_unmarked_cells(own, opp):
+                (value, plies), _ = negamax(opp, own | cell)
+                value, plies = -value, plies + 1
+                # Win sooner or lose later, then follow the heuristic
+                options.append(((value, -plies * value, heuristic.get_score(own | cell, opp)), plies, cell))
+            (value, _, _), plies, cell = max(options, key=lambda option: option[0])
+            result = (value, plies), cell
+        solved[rank] = result
+        return result
+
+    negamax(0, 0)
+    return {
+        rank: (VALUE.DRAW + value, NO_MOVE if cell is None else bitboard.cell_index(cell))
+        for rank, ((value, _), cell) in solved.items()
+    }
+
+
+def get_table():
+    """Returns the tablebase entries of every position rank, without the header"""
+    table = bytearray(POSITIONS)
+    for rank, (value, move) in solve().items():
+        table[rank] = value << 4 | move
+    return table
+
+
+def build(path=PATH):
+    table = get_table()
+    with open(path, "wb") as file:
+        file.write(MAGIC + table)
+    return sum(1 for entry in table if entry)
+
+
+if __name__ == "__main__":
+    print("wrote", build(), "positions to", PATH)
@@ -0,0 +1,198 @@
+"""Round-robin tournaments and SPRT tests between the agents of simulate.py.
+
+``python tournament.py computer search easy random`` plays every pair and prints
+Elo differences with 95% confidence intervals. ``python tournament.py --sprt
+search easy`` plays one pair until the SPRT accepts that the first agent is
+``--elo1`` stronger or no more than ``--elo0`` stronger.
+"""
+import argparse
+import itertools
+import math
+import time
+from multiprocessing import Pool, cpu_count
+
+from main import MARKER, Grid
+from simulate import AGENTS, create_agent, play_game
+
+BATCH_SIZE = 20
+Z_95 = 1.96
+
+
+def play_batch(batch):
+    """Plays a run of games between two agents and returns the wins, draws and losses of agent A.
+
+    Game ``n`` gives agent A the first move when ``n`` is even and x when ``n // 2`` is even,
+    so every four games cover each order and marker, as switching them in the menu would.
+    """
+    name_a, name_b, start, games, seed, board_size = batch
+    results = [0, 0, 0]
+    for game in range(start, start + games):
+        marker_a = MARKER.X if game // 2 % 2 == 0 else MARKER.O
+        marker_b = MARKER.O if marker_a == MARKER.X else MARKER.X
+        a_first = game % 2 == 0
+        seed_a, seed_b = (None, None) if seed is None else (f"{seed}:{game}:a", f"{seed}:{game}:b")
+        agent_a = create_agent(name_a, marker_a, "first" if a_first else "second", seed_a)
+        agent_b = create_agent(name_b, marker_b, "second" if a_first else "first", seed_b)
+        first, second = (agent_a, agent_b) if a_first else (agent_b, agent_a)
+        winner = play_game(first, second, Grid(*board_size))
+        if winner is None:
+            results[1] += 1
+        elif winner is agent_a:
+            results[0] += 1
+        else:
+            results[2] += 1
+    return results
+
+
+def get_batches(name_a, name_b, games, seed, board_size):
+    return [
+        (name_a, name_b, start, min(BATCH_SIZE, games - start), seed, board_size)
+        for start in range(0, games, BATCH_SIZE)
+    ]
+
+
+def get_score(wins, draws, losses):
+    return (wins + draws / 2) / (wins + draws + losses)
+
+
+def score_to_elo(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    # Adding zero turns -0.0 into 0.0
+    return -400 * math.log10(1 / score - 1) + 0.0
+
+
+def elo_to_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def get_elo(wins, draws, losses):
+    """Returns the Elo difference of A over B and the bounds of its 95% confidence interval"""
+    games = wins + draws + losses
+    score = get_score(wins, draws, losses)
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = Z_95 * math.sqrt(variance / games)
+    return score_to_elo(score), score_to_elo(score - margin), score_to_elo(score + margin)
+
+
+def get_llr(wins, draws, losses, elo0, elo1):
+    """Log-likelihood ratio of A being ``elo1`` rather than ``elo0`` stronger, by the normal approximation.
+
+    Half a win and half a loss are added, so a run of nothing but draws still has a variance.
+    """
+    wins, losses = wins + 0.5, losses + 0.5
+    games = wins + draws + losses
+    score = get_score(wins, draws, losses)
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    score0, score1 = elo_to_score(elo0), elo_to_score(elo1)
+    return (score1 - score0) * (2 * score - score0 - score1) / (2 * variance) * games
+
+
+class SPRT:
+    def __init__(self, elo0=0.0, elo1=20.0, alpha=0.05, beta=0.05):
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+
+    def get_result(self, wins, draws, losses):
+        """Returns "H1" or "H0" once one is accepted, or None to keep playing"""
+        llr = get_llr(wins, draws, losses, self.elo0, self.elo1)
+        if llr >= self.upper:
+            return "H1"
+        if llr <= self.lower:
+            return "H0"
+        return None
+
+
+def run_pair(pool, name_a, name_b, games, seed=None, board_size=(3, 3, 3), sprt=None):
+    """Plays up to ``games`` games and returns A's wins, draws and losses and the SPRT result, if any.
+
+    With an SPRT, batches are checked as they finish and the rest are dropped once it decides.
+    """
+    results = [0, 0, 0]
+    decision = None
+    batches = get_batches(name_a, name_b, games, seed, board_size)
+    for batch_results in pool.imap_unordered(play_batch, batches):
+        results = [total + count for total, count in zip(results, batch_results)]
+        if sprt is not None:
+            decision = sprt.get_result(*results)
+            if decision is not None:
+                break
+    return results, decision
+
+
+def get_ratings(pair_results, iterations=1000):
+    """Fits one Elo rating per agent to all the pair results, with the average rating at 0"""
+    names = sorted({name for pair in pair_results for name in pair})
+    ratings = dict.fromkeys(names, 0.0)
+    for _ in range(iterations):
+        change = 0.0
+        for name in names:
+            score = expected = games = 0
+            for (name_a, name_b), (wins, draws, losses) in pair_results.items():
+                if name not in (name_a, name_b):
+                    continue
+                count = wins + draws + losses
+                other = name_b if name == name_a else name_a
+                points = wins + draws / 2 if name == name_a else losses + draws / 2
+                score += points
+                expected += count * elo_to_score(ratings[name] - ratings[other])
+                games += count
+            # A step towards the rating that makes the expected score match the actual score
+            step = (score_to_elo(score / games) - score_to_elo(expected / games)) / 2 if games else 0.0
+            ratings[name] += step
+            change = max(change, abs(step))
+        mean = sum(ratings.values()) / len(ratings)
+        for name in names:
+            ratings[name] -= mean
+        if change < 0.01:
+            break
+    return ratings
+
+
+def format_elo(wins, draws, losses):
+    elo, low, high = get_elo(wins, draws, losses)
+    return f"{wins}-{draws}-{losses}  elo {elo:+.0f} [{low:+.0f}, {high:+.0f}]"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("agents", nargs="+", choices=AGENTS)
+    parser.add_argument("-n", "--games", type=int, default=1000, help="games per pair (most games with --sprt)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="processes to use (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--columns", type=int, default=3)
+    parser.add_argument("--win-length", type=int, default=3)
+    parser.add_argument("--sprt", action="store_true", help="test the first two agents with an SPRT")
+    parser.add_argument("--elo0", type=float, default=0.0)
+    parser.add_argument("--elo1", type=float, default=20.0)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    args = parser.parse_args()
+
+    board_size = (args.rows, args.columns, args.win_length)
+    start = time.perf_counter()
+    with Pool(args.workers or cpu_count()) as pool:
+        if args.sprt:
+            name_a, name_b = args.agents[:2]
+            sprt = SPRT(args.elo0, args.elo1, args.alpha, args.beta)
+            results, decision = run_pair(pool, name_a, name_b, args.games, args.seed, board_size, sprt)
+            print(f"{name_a} vs {name_b}: {format_elo(*results)}")
+            llr = get_llr(*results, args.elo0, args.elo1)
+            verdict = {"H1": f"at least {args.elo1:+g}", "H0": f"no more than {args.elo0:+g}"}.get(decision)
+            print(f"SPRT llr {llr:.2f} [{sprt.lower:.2f}, {sprt.upper:.2f}]: "
+                  + (f"{name_a} is {verdict} elo" if verdict else "no decision"))
+        else:
+            pair_results = {}
+            for name_a, name_b in itertools.combinations(args.agents, 2):
+                pair_results[name_a, name_b], _ = run_pair(pool, name_a, name_b, args.games, args.seed, board_size)
+                print(f"{name_a} vs {name_b}: {format_elo(*pair_results[name_a, name_b])}")
+            print("ratings")
+            for name, rating in sorted(get_ratings(pair_results).items(), key=lambda item: -item[1]):
+                print(f"  {name:<10} {rating:+.0f}")
+    print(f"{time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,487 @@
+"""Checks the engine's fast paths against plain versions of the original algorithms, without a display.
+
+``python verify.py`` compares Grid.check_win, check_tie and get_winning_cells on
+every 3x3 board, and Computer.choose_cell, the tablebase and batch.py on every
+reachable 3x3 position, with straightforward rewrites of the original code.
+Random play on larger boards checks the incremental win lines and the alpha-beta
+search. Every fast path is timed against the original get_winning_cells, and
+fails if it got more than ``--threshold`` slower than in verify_baseline.json;
+``--save`` records a new baseline. The exit status is 1 if anything disagrees.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import benchmark
+import bitboard
+import search
+import tablebase
+from main import MARKER, Computer, Grid
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "verify_baseline.json")
+BOARD_SIZES = [(4, 4, 3), (3, 5, 3), (5, 5, 4), (6, 7, 4), (2, 6, 5), (1, 4, 2)]
+SEARCH_SIZES = [(4, 4, 3), (5, 5, 4), (6, 6, 4)]
+
+
+def get_opponent(marker):
+    return MARKER.O if marker == MARKER.X else MARKER.X
+
+
+def get_lines(rows, columns, win_length):
+    """Returns the name and cell indices of every win line, in the order the original check_win tried them"""
+    lines = []
+    for row in range(rows):
+        for col in range(columns - win_length + 1):
+            lines.append(("row", [row * columns + col + i for i in range(win_length)]))
+    for row in range(rows - win_length + 1):
+        for col in range(columns):
+            lines.append(("column", [(row + i) * columns + col for i in range(win_length)]))
+    for row in range(rows - win_length + 1):
+        for col in range(columns - win_length + 1):
+            lines.append(("ascending diagonal", [(row + i) * columns + col + win_length - 1 - i
+                                                 for i in range(win_length)]))
+    for row in range(rows - win_length + 1):
+        for col in range(columns - win_length + 1):
+            lines.append(("descending diagonal", [(row + i) * columns + col + i for i in range(win_length)]))
+    return lines
+
+
+CLASSIC_LINES = get_lines(3, 3, 3)
+
+
+def check_win(board, marker, lines=CLASSIC_LINES):
+    for name, line in lines:
+        if all(marker == board[index] for index in line):
+            return True, line, name
+    return False, None, None
+
+
+def check_tie(board):
+    return None not in board
+
+
+def get_winning_cells(board, marker, lines=CLASSIC_LINES):
+    winning_cells = []
+    for _, line in lines:
+        if sum(marker == board[index] for index in line) == len(line) - 1:
+            winning_cells += [index for index in line if board[index] is None]
+    return winning_cells
+
+
+class ReferenceComputer:
+    """The original Computer.get_score and choose_cell, on a list of the 3x3 board's markers"""
+    def __init__(self, marker):
+        self.marker = marker
+        self.opponent_marker = get_opponent(marker)
+
+    def get_score(self, board, score=0, turn=1):
+        if check_tie(board):
+            return score
+        if check_win(board, self.marker)[0]:
+            return score + 10 ** (9 - turn)
+        losing_cells = get_winning_cells(board, self.opponent_marker)
+        if losing_cells:
+            return score - len(losing_cells) * 10 ** (9 - turn)
+        next_turn = turn + 1
+        winning_cells = get_winning_cells(board, self.marker)
+        if winning_cells:
+            score += 10 ** (9 - next_turn)
+            if len(winning_cells) > 1:
+                return score + 10 ** (9 - next_turn)
+            board[winning_cells[0]] = self.opponent_marker
+            for index in get_unmarked(board):
+                board[index] = self.marker
+                score = self.get_score(board, score, next_turn + 1)
+                board[index] = None
+            board[winning_cells[0]] = None
+        else:
+            for opponent_index in get_unmarked(board):
+                board[opponent_index] = self.opponent_marker
+                losing_cells = get_winning_cells(board, self.opponent_marker)
+                if losing_cells:
+                    board[losing_cells[0]] = self.marker
+                    score = self.get_score(board, score, next_turn + 1)
+                    board[losing_cells[0]] = None
+                else:
+                    for index in get_unmarked(board):
+                        board[index] = self.marker
+                        score = self.get_score(board, score, next_turn + 1)
+                        board[index] = None
+                board[opponent_index] = None
+        return score
+
+    def choose_cell(self, board):
+        """Returns the index of the cell to mark and the score of every unmarked cell"""
+        scores = {}
+        for index in get_unmarked(board):
+            board[index] = self.marker
+            scores[index] = self.get_score(board)
+            board[index] = None
+        return max(scores, key=scores.get), scores
+
+
+def get_unmarked(board):
+    return [index for index, marker in enumerate(board) if marker is None]
+
+
+@lru_cache(maxsize=None)
+def get_value(board, marker):
+    """Returns 1, 0 or -1 as ``marker``, who is to move on the 3x3 board tuple, wins, draws or loses with perfect play"""
+    best = -1
+    for index in get_unmarked(board):
+        child = board[:index] + (marker,) + board[index + 1:]
+        if check_win(child, marker)[0]:
+            return 1
+        value = 0 if check_tie(child) else -get_value(child, get_opponent(marker))
+        best = max(best, value)
+    return best
+
+
+def get_move_value(board, marker, index):
+    child = board[:index] + (marker,) + board[index + 1:]
+    if check_win(child, marker)[0]:
+        return 1
+    return 0 if check_tie(child) else -get_value(child, get_opponent(marker))
+
+
+def get_positions():
+    """Returns every 3x3 position a game can reach that is not over, with the marker to move, in play order"""
+    positions = {}
+
+    def play(board, marker):
+        if (board, marker) in positions:
+            return
+        positions[board, marker] = None
+        for index in get_unmarked(board):
+            child = board[:index] + (marker,) + board[index + 1:]
+            if not check_win(child, marker)[0] and not check_tie(child):
+                play(child, get_opponent(marker))
+
+    for first in (MARKER.X, MARKER.O):
+        play((None,) * 9, first)
+    return list(positions)
+
+
+def load(grid, board):
+    for cell, marker in zip(grid.cell_list, board):
+        if cell.marker != marker:
+            cell.marker = marker
+    return grid
+
+
+def get_bits(board, marker):
+    return sum(1 << index for index, cell_marker in enumerate(board) if cell_marker == marker)
+
+
+def to_string(board):
+    return "".join(marker or "." for marker in board)
+
+
+def to_indices(grid, cells):
+    return None if cells is None else [cell.row * grid.columns + cell.col for cell in cells]
+
+
+def get_grid_answers(grid):
+    answers = [grid.check_tie()]
+    for marker in (MARKER.X, MARKER.O):
+        won, cells, name = grid.check_win(marker)
+        answers += [(won, to_indices(grid, cells), name), to_indices(grid, grid.get_winning_cells(marker))]
+    return answers
+
+
+def get_reference_answers(board, lines):
+    answers = [check_tie(board)]
+    for marker in (MARKER.X, MARKER.O):
+        answers += [check_win(board, marker, lines), get_winning_cells(board, marker, lines)]
+    return answers
+
+
+class Check:
+    """Counts the cases of one check and keeps the first few that disagree"""
+    SHOWN = 5
+
+    def __init__(self, name):
+        self.name = name
+        self.cases = 0
+        self.failures = 0
+        self.examples = []
+
+    def compare(self, case, expected, actual):
+        self.cases += 1
+        if expected != actual:
+            self.fail(f"{case}: expected {expected!r}, got {actual!r}")
+
+    def fail(self, message):
+        self.failures += 1
+        if len(self.examples) < Check.SHOWN:
+            self.examples.append(message)
+
+    def report(self):
+        print(f"{self.name:<28} {self.cases:>7} cases  {'ok' if not self.failures else f'{self.failures} FAILED'}")
+        for example in self.examples:
+            print(f"  {example}")
+        return not self.failures
+
+
+def check_classic_grid():
+    """Checks every 3x3 board, changing one grid a cell at a time so the incremental updates are used"""
+    check = Check("grid 3x3, every board")
+    grid = Grid()
+    for board in itertools.product((None, MARKER.X, MARKER.O), repeat=9):
+        load(grid, board)
+        check.compare(to_string(board), get_reference_answers(board, CLASSIC_LINES), get_grid_answers(grid))
+    return check
+
+
+def check_grid(rows, columns, win_length, moves, rng):
+    """Marks, overwrites and clears random cells, with an occasional copy and clear of the whole grid"""
+    check = Check(f"grid {rows}x{columns}x{win_length}, random")
+    lines = get_lines(rows, columns, win_length)
+    grid = Grid(rows, columns, win_length)
+    board = [None] * (rows * columns)
+    for move in range(moves):
+        index = rng.randrange(len(board))
+        board[index] = grid.cell_list[index].marker = rng.choice((MARKER.X, MARKER.O, None))
+        expected = get_reference_answers(board, lines)
+        case = f"move {move} {to_string(board)}"
+        check.compare(case, expected, get_grid_answers(grid))
+        # Asked twice, so a stale memo of the threats shows up too
+        check.compare(case, expected, get_grid_answers(grid))
+        if rng.random() < 0.05:
+            check.compare(f"copy of {case}", expected, get_grid_answers(grid.copy()))
+        if rng.random() < 0.01:
+            grid.clear()
+            board = [None] * len(board)
+            check.compare(f"clear after move {move}", get_reference_answers(board, lines), get_grid_answers(grid))
+    return check
+
+
+def check_choose_cell(positions):
+    """Compares the move and the score of every cell with the original search, with one table per marker"""
+    check = Check("choose_cell, search")
+    grid = Grid()
+    computers = {marker: Computer(marker, use_tablebase=False) for marker in (MARKER.X, MARKER.O)}
+    for board, marker in positions:
+        index, scores = ReferenceComputer(marker).choose_cell(list(board))
+        cell = computers[marker].choose_cell(load(grid, board))
+        actual_scores = {cell.row * 3 + cell.col: cell.score for cell in grid.get_unmarked_cells()}
+        check.compare(f"{marker} to move on {to_string(board)}", (index, scores),
+                      (cell.row * 3 + cell.col, actual_scores))
+    return check
+
+
+def check_tablebase(positions):
+    """Compares tablebase values with a plain solver and checks that the computer's moves keep the value"""
+    check = Check("choose_cell, tablebase")
+    table = tablebase.get_default()
+    if table is None:
+        print("no tablebase.bin, run python tablebase.py to check it")
+        return check
+    values = {tablebase.VALUE.WIN: 1, tablebase.VALUE.DRAW: 0, tablebase.VALUE.LOSS: -1}
+    grid = Grid()
+    computers = {marker: Computer(marker) for marker in (MARKER.X, MARKER.O)}
+    for board, marker in positions:
+        case = f"{marker} to move on {to_string(board)}"
+        value = get_value(board, marker)
+        probed, _ = table.probe(get_bits(board, marker), get_bits(board, get_opponent(marker)))
+        cell = computers[marker].choose_cell(load(grid, board))
+        check.compare(case, (value, value), (values.get(probed), get_move_value(board, marker, cell.row * 3 + cell.col)))
+    return check
+
+
+def check_batch(positions):
+    check = Check("batch.evaluate")
+    try:
+        import numpy as np
+        import batch
+    except ImportError:
+        print("NumPy is not installed, skipping batch.py")
+        return check
+    boards = list(itertools.product((None, MARKER.X, MARKER.O), repeat=9))
+    codes = {None: batch.EMPTY, MARKER.X: batch.X, MARKER.O: batch.O}
+    evaluation = batch.evaluate(np.array([[codes[marker] for marker in board] for board in boards]))
+    for i, board in enumerate(boards):
+        winner = next((marker for marker in (MARKER.X, MARKER.O) if check_win(board, marker)[0]), None)
+        expected = (codes[winner], check_tie(board),
+                    len(get_winning_cells(board, MARKER.X)), len(get_winning_cells(board, MARKER.O)))
+        actual = (evaluation.winners[i], evaluation.ties[i], evaluation.x_threats[i], evaluation.o_threats[i])
+        check.compare(to_string(board), expected, tuple(value.item() for value in actual))
+    if tablebase.get_default() is not None:
+        boards = np.array([[codes[cell] for cell in board] for board, _ in positions])
+        moves = batch.get_best_moves(boards, np.array([codes[marker] for _, marker in positions], dtype=np.int8))
+        for (board, marker), move in zip(positions, moves.tolist()):
+            check.compare(f"best move for {marker} on {to_string(board)}", get_value(board, marker),
+                          None if move < 0 else get_move_value(board, marker, move))
+    return check
+
+
+def get_random_position(rows, columns, win_length, rng):
+    """Returns a board with no completed line and the marker to move, x having moved first"""
+    lines = get_lines(rows, columns, win_length)
+    while True:
+        board = [None] * (rows * columns)
+        markers = rng.randrange(len(board) - 1)
+        for turn, index in enumerate(rng.sample(range(len(board)), markers)):
+            board[index] = MARKER.X if turn % 2 == 0 else MARKER.O
+        if not check_win(board, MARKER.X, lines)[0] and not check_win(board, MARKER.O, lines)[0]:
+            return board, MARKER.X if markers % 2 == 0 else MARKER.O
+
+
+def check_alpha_beta(positions, rng, executor):
+    """Checks that a two-ply alpha-beta search wins when it can and blocks a single threat.
+
+    With an executor, the parallel search must choose the same move as the serial one.
+    """
+    check = Check("alpha-beta, random")
+    for rows, columns, win_length in SEARCH_SIZES:
+        geometry = bitboard.get_geometry(rows, columns, win_length)
+        lines = get_lines(rows, columns, win_length)
+        for _ in range(positions):
+            board, marker = get_random_position(rows, columns, win_length, rng)
+            own, opp = get_bits(board, marker), get_bits(board, get_opponent(marker))
+            case = f"{marker} to move on {rows}x{columns}x{win_length} {to_string(board)}"
+            move = search.AlphaBeta(geometry, time_budget=60, max_depth=2).choose(own, opp)
+            index = bitboard.cell_index(move)
+            winning_cells = get_winning_cells(board, marker, lines)
+            losing_cells = set(get_winning_cells(board, get_opponent(marker), lines))
+            if board[index] is not None:
+                check.fail(f"{case}: chose the marked cell {index}")
+            elif winning_cells and index not in winning_cells:
+                check.fail(f"{case}: chose {index} instead of winning at {winning_cells}")
+            elif not winning_cells and len(losing_cells) == 1 and index not in losing_cells:
+                check.fail(f"{case}: chose {index} instead of blocking at {losing_cells.pop()}")
+            else:
+                check.cases += 1
+            if executor is not None:
+                parallel = search.ParallelAlphaBeta(geometry, executor, time_budget=60, max_depth=2)
+                check.compare(f"{case} in parallel", index, bitboard.cell_index(parallel.choose(own, opp)))
+    return check
+
+
+def check_parallel_choose_cell(positions, executor):
+    check = Check("choose_cell, parallel")
+    grid = Grid()
+    for board, marker in positions:
+        serial = Computer(marker, use_tablebase=False).choose_cell(load(grid, board))
+        parallel = Computer(marker, use_tablebase=False, executor=executor).choose_cell(load(grid, board))
+        check.compare(f"{marker} to move on {to_string(board)}", (serial.row, serial.col), (parallel.row, parallel.col))
+    return check
+
+
+def call_each(func, items):
+    """Returns a function that calls ``func`` on every item, for benchmark.time_calls"""
+    def call_all():
+        for item in items:
+            func(*item)
+    return call_all
+
+
+def time_relative(func, calibration, repeat):
+    """Returns how many times faster a call of ``func`` is than one of ``calibration``.
+
+    The two are timed alternately, so a machine that speeds up or slows down during the run
+    changes both alike.
+    """
+    fast = slow = None
+    for _ in range(repeat):
+        elapsed = benchmark.time_calls(func, 1)
+        fast = elapsed if fast is None else min(fast, elapsed)
+        elapsed = benchmark.time_calls(calibration, 1)
+        slow = elapsed if slow is None else min(slow, elapsed)
+    return slow / fast
+
+
+def get_timings(positions, repeat=20):
+    """Returns the speed of every fast path relative to the original get_winning_cells, on positions fixed by a seed of 0.
+
+    Metrics are named as in benchmark.py, so benchmark.compare checks them against a baseline.
+    """
+    rng = random.Random(0)
+    calibration = call_each(get_winning_cells, [(list(board), MARKER.X) for board, _ in positions[:1000]])
+    timings = {}
+    for rows, columns, win_length in [(3, 3, 3)] + BOARD_SIZES:
+        grids = [load(Grid(rows, columns, win_length), get_random_position(rows, columns, win_length, rng)[0])
+                 for _ in range(200)]
+        for method in ("check_win", "get_winning_cells"):
+            queries = [(grid, MARKER.X) for grid in grids] * 100
+            speed = time_relative(lambda: benchmark.query_grids(queries, method), calibration, repeat)
+            timings[f"{method}_{rows}x{columns}x{win_length}"] = {"relative_speed": speed}
+    # A new computer for every move, so the transposition table starts empty
+    sample = rng.sample([position for position in positions if 2 <= sum(map(bool, position[0])) <= 4], 20)
+    grid = Grid()
+    choose = call_each(lambda board, marker: Computer(marker, use_tablebase=False).choose_cell(load(grid, board)),
+                       sample)
+    speed = time_relative(choose, calibration, repeat)
+    timings["choose_cell_search"] = {"relative_speed": speed}
+    geometry = bitboard.get_geometry(5, 5, 4)
+    sample = [get_random_position(5, 5, 4, rng) for _ in range(10)]
+    bits = [(get_bits(board, marker), get_bits(board, get_opponent(marker))) for board, marker in sample]
+    choose = call_each(lambda own, opp: search.AlphaBeta(geometry, time_budget=60, max_depth=2).choose(own, opp),
+                       bits)
+    speed = time_relative(choose, calibration, repeat)
+    timings["alpha_beta_5x5x4"] = {"relative_speed": speed}
+    return timings
+
+
+def check_timings(timings, baseline, threshold):
+    """Fails every timing more than ``threshold`` worse than the baseline, as benchmark.py --compare does"""
+    check = Check("timings")
+    regressions = benchmark.compare(timings, baseline, threshold)
+    check.cases = sum(1 for name in timings if name in baseline)
+    for regression in regressions:
+        check.fail(regression)
+    return check
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--moves", type=int, default=2000, help="random moves per board size")
+    parser.add_argument("--positions", type=int, default=100, help="random alpha-beta positions per board size")
+    parser.add_argument("-w", "--workers", type=int, default=2, help="processes for the parallel checks (0 skips them)")
+    parser.add_argument("--baseline", metavar="FILE", default=BASELINE, help="timings to compare with")
+    parser.add_argument("--save", action="store_true", help="write the timings to the baseline file instead")
+    # Wider than benchmark.py's, since every run compares with a recorded baseline and must not flake
+    parser.add_argument("--threshold", type=float, default=0.5, help="allowed slowdown, as a fraction")
+    parser.add_argument("--no-timings", dest="timings", action="store_false")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    positions = get_positions()
+    print(f"{len(positions)} reachable 3x3 positions")
+    checks = [check_classic_grid()]
+    checks += [check_grid(*size, args.moves, rng) for size in BOARD_SIZES]
+    checks += [check_choose_cell(positions), check_tablebase(positions), check_batch(positions)]
+    if args.workers:
+        with ProcessPoolExecutor(args.workers) as executor:
+            checks.append(check_alpha_beta(args.positions, rng, executor))
+            checks.append(check_parallel_choose_cell(rng.sample(positions, 50), executor))
+    else:
+        checks.append(check_alpha_beta(args.positions, rng, None))
+    if args.timings:
+        timings = get_timings(positions)
+        for name, metrics in timings.items():
+            print(f"{name:<28} " + "  ".join(f"{metric} {value:.4g}" for metric, value in metrics.items()))
+        if args.save:
+            with open(args.baseline, "w") as file:
+                json.dump(timings, file, indent=2)
+        elif os.path.exists(args.baseline):
+            with open(args.baseline) as file:
+                checks.append(check_timings(timings, json.load(file), args.threshold))
+        else:
+            print(f"no baseline at {args.baseline}, run with --save to record one")
+    passed = all([check.report() for check in checks])
+    print(f"{time.perf_counter() - start:.2f}s")
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()